@@ -31,6 +31,9 @@ if PY3:
 
     from urllib.parse import urlparse as urlparse_mod
     urlparse = urlparse_mod
+    from urllib.parse import unquote
+
+    from queue import Queue
 
     input = input
 
@@ -53,6 +56,9 @@ else:
 
     from urlparse import urlparse as urlparse_mod
     urlparse = urlparse_mod
+    from urllib import unquote
+
+    from Queue import Queue
 
     input = raw_input
 
@@ -4,15 +4,28 @@
 
 from __future__ import absolute_import, division, print_function
 from muninn._compat import string_types as basestring
+from muninn._compat import long
+from muninn._compat import Queue, urlparse
 
+import base64
+import collections
 import copy
 import datetime
 import errno
+import json
+import logging
+import multiprocessing.pool
 import os
 import re
+import sqlite3
 import sys
 import uuid
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import muninn.config as config
 import muninn.util as util
 
@@ -23,6 +36,12 @@ from muninn.schema import *
 from muninn.struct import Struct
 from muninn import remote
 
+# Properties required to remove, strip, retrieve, or export a product.
+_ACCESS_PROPERTY_NAMES = ['uuid', 'active', 'product_type', 'product_name', 'archive_path', 'physical_name']
+
+# Properties required to verify the hash of a product.
+_VERIFY_PROPERTY_NAMES = _ACCESS_PROPERTY_NAMES + ['hash']
+
 
 class _ArchiveList(Sequence):
     _alias = "archive_list"
@@ -57,6 +76,11 @@ class _ArchiveConfig(Mapping):
     product_type_extensions = optional(_ExtensionList)
     remote_backend_extensions = optional(_ExtensionList)
     auth_file = optional(Text)
+    use_hash_cache = optional(Boolean)
+    copy_strategy = optional(Text)
+    copy_workers = optional(Integer)
+    download_chunk_size = optional(Integer)
+    use_trash = optional(Boolean)
 
 
 def _load_backend_module(name):
@@ -126,10 +150,96 @@ def create(configuration):
     return archive
 
 
+def _encode_page_token(order_by, values):
+    encoded_values = []
+    for name, value in zip(order_by, values):
+        if value is None:
+            encoded_values.append(["null", None])
+        elif isinstance(value, datetime.datetime):
+            # strftime() does not zero pad years before 1000 (and does not support years before 1900 on Python 2).
+            encoded_values.append(["timestamp", "%04d-%02d-%02dT%02d:%02d:%02d.%06d" %
+                                   (value.year, value.month, value.day, value.hour, value.minute, value.second,
+                                    value.microsecond)])
+        elif isinstance(value, uuid.UUID):
+            encoded_values.append(["uuid", value.hex])
+        elif isinstance(value, (bool, int, long, float) + basestring):
+            encoded_values.append(["value", value])
+        else:
+            raise Error("cannot paginate on sort key %r of type %r" % (name.lstrip("+-"), type(value).__name__))
+
+    token = json.dumps({"order_by": order_by, "values": encoded_values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+
+def _decode_page_token(token, order_by):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(token)).decode("utf-8"))
+        token_order_by, encoded_values = data["order_by"], data["values"]
+
+        values = []
+        for value_type, value in encoded_values:
+            if value_type == "null":
+                values.append(None)
+            elif value_type == "timestamp":
+                values.append(datetime.datetime(*[int(field) for field in re.split(r"[-T:.]", value)]))
+            elif value_type == "uuid":
+                values.append(uuid.UUID(hex=value))
+            elif value_type == "value":
+                values.append(value)
+            else:
+                raise ValueError("unknown value type: %r" % value_type)
+    except (TypeError, ValueError, KeyError):
+        raise Error("invalid continuation token: %r" % token)
+
+    if token_order_by != order_by:
+        raise Error("continuation token does not match sort order %r" % order_by)
+
+    return values
+
+
+def _property_value(product, name):
+    # Return the value of the property with the specified full name, or None if it is undefined. Undefined properties
+    # (and namespaces) are not included in the product properties.
+    namespace, name = name.split(".")
+    if namespace not in product or name not in product[namespace]:
+        return None
+    return product[namespace][name]
+
+
+_COLUMN_DTYPES = {Long: "int64", Integer: "int32", Real: "float64", Boolean: "bool"}
+
+
+def _column_array(values, type):
+    if type is Timestamp:
+        # Undefined timestamps are converted to NaT.
+        return numpy.array(values, dtype="datetime64[us]")
+    elif type is UUID:
+        return numpy.array([b"" if value is None else value.bytes for value in values], dtype="S16")
+
+    dtype = _COLUMN_DTYPES.get(type)
+    if dtype is None:
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    elif None in values:
+        return numpy.ma.array([0 if value is None else value for value in values],
+                              mask=[value is None for value in values], dtype=dtype)
+    return numpy.array(values, dtype=dtype)
+
+
+def _concatenate_columns(arrays, type):
+    if not arrays:
+        return _column_array([], type)
+    elif any(isinstance(array, numpy.ma.MaskedArray) for array in arrays):
+        return numpy.ma.concatenate(arrays)
+    return numpy.concatenate(arrays)
+
+
 class Archive(object):
 
     def __init__(self, root, backend, use_symlinks=False, cascade_grace_period=0, max_cascade_cycles=25,
-                 external_archives=[], auth_file=None):
+                 external_archives=[], auth_file=None, use_hash_cache=False, copy_strategy="reflink",
+                 copy_workers=1, download_chunk_size=1048576, use_trash=False):
         self._root = root
         self._backend = backend
         self._use_symlinks = use_symlinks
@@ -137,6 +247,14 @@ class Archive(object):
         self._max_cascade_cycles = max_cascade_cycles
         self._external_archives = external_archives
         self._auth_file = auth_file
+        self._use_hash_cache = use_hash_cache
+        if copy_strategy not in util.COPY_STRATEGIES:
+            raise Error("invalid copy strategy: %r; supported strategies: %s" %
+                        (copy_strategy, util.quoted_list(util.COPY_STRATEGIES)))
+        self._copy_strategy = copy_strategy
+        self._copy_workers = copy_workers
+        self._download_chunk_size = download_chunk_size
+        self._use_trash = use_trash
 
         self._namespace_schemas = {}
         self._product_type_plugins = {}
@@ -151,11 +269,74 @@ class Archive(object):
     def __exit__(self, type, value, traceback):
         self.close()
 
+    def _analyze_product(self, paths, product_type=None, properties=None):
+        """Determine the product type (if not specified) and the properties of the product specified by paths, and set
+        all core properties that are not determined by the product type plug-in. Returns a tuple of (absolute) paths,
+        product type plug-in, properties, and tags.
+
+        """
+        if isinstance(paths, basestring):
+            paths = [paths]
+
+        if not paths:
+            raise Error("nothing to ingest")
+
+        # Use absolute paths to make error messages more useful, and to avoid broken links when ingesting a product
+        # using symbolic links.
+        paths = [os.path.realpath(path) for path in paths]
+
+        # Ensure that the set of files and / or directories that make up the product does not contain duplicate
+        # basenames.
+        if util.contains_duplicates([os.path.basename(path) for path in paths]):
+            raise Error("basename of each part should be unique for multi-part products")
+
+        # Get the product type plug-in.
+        if product_type is None:
+            product_type = self.identify(paths)
+        plugin = self.product_type_plugin(product_type)
+
+        # Extract product metadata.
+        if properties is None:
+            metadata = plugin.analyze(paths)
+            if isinstance(metadata, (tuple, list)):
+                properties, tags = metadata
+            else:
+                properties, tags = metadata, []
+        else:
+            properties, tags = copy.deepcopy(properties), []
+
+        assert properties is not None and "core" in properties
+        assert "product_name" in properties.core and properties.core.product_name, \
+            "product_name is required in core.properties"
+
+        # Set core product properties that are not determined by the plugin.
+        # Note that metadata_date is set automatically by create_properties()
+        # and archive_date is properly set when we activate the product.
+        properties.core.uuid = self.generate_uuid()
+        properties.core.active = False
+        properties.core.hash = None
+        properties.core.size = util.product_size(paths)
+        properties.core.metadata_date = None
+        properties.core.archive_date = None
+        properties.core.archive_path = None
+        properties.core.product_type = product_type
+        properties.core.physical_name = None
+
+        # Determine physical product name.
+        if plugin.use_enclosing_directory:
+            properties.core.physical_name = plugin.enclosing_directory(properties)
+        elif len(paths) == 1:
+            properties.core.physical_name = os.path.basename(paths[0])
+        else:
+            raise Error("cannot determine physical name for multi-part product")
+
+        return paths, plugin, properties, tags
+
     def _archive_exists(self):
         # Check if the archive path exists
         return os.path.isdir(self._root)
 
-    def _calculate_hash(self, product):
+    def _calculate_hash(self, product, cache=None, workers=None):
         """ calculate the hash on a product in the archive """
         product_path = self._product_path(product)
         if not product_path:
@@ -169,12 +350,68 @@ class Archive(object):
             paths = [os.path.join(product_path, basename) for basename in os.listdir(product_path)]
         else:
             paths = [product_path]
-        return util.product_hash(paths)
+        return util.product_hash(paths, cache=cache, workers=workers)
+
+    def _cascade_scope(self, products):
+        """Return the uuids of the products that may have to be removed (or stripped) when the specified products are
+        removed (or stripped), i.e. the products derived from them. This should be called before the products are
+        removed, because removing a product also removes the links to it.
+
+        Return None if all products should be considered. This is the case if a cascade grace period is used, because
+        products that are skipped during a cascade (because of the grace period) should be considered by subsequent
+        cascades as well.
+
+        """
+        if self._cascade_grace_period:
+            return None
+        return self._backend.find_derived_products([product.core.uuid for product in products])
 
     def _catalogue_exists(self):
         return self._backend.exists()
 
-    def _establish_invariants(self):
+    def _collect_pull_staging(self):
+        """Remove the staging directories of pulls that failed and are not being retried, i.e. of products that are
+        not being pulled (see pull()).
+
+        """
+        journal_path = self._pull_staging_journal_path()
+        if not os.path.isdir(journal_path):
+            return
+
+        for name in sorted(os.listdir(journal_path)):
+            if not name.endswith(".json"):
+                continue
+
+            try:
+                with open(os.path.join(journal_path, name)) as stream:
+                    journal = json.load(stream)
+                product_uuid = uuid.UUID(journal['uuid'])
+                staging_path = os.path.join(self._root, journal['path'])
+            except (EnvironmentError, ValueError, KeyError) as _error:
+                logging.warning("skipping invalid pull staging journal entry '%s' [%s]", name, _error)
+                continue
+
+            # A product that is being pulled is deactivated and has its archive path set.
+            products = self._backend.search_by_uuids([product_uuid], property_names=['active', 'archive_path'])
+            if products and not products[0].core.active and 'archive_path' in products[0].core:
+                continue
+
+            logging.debug("removing pull staging directory '%s'", journal['path'])
+            try:
+                if os.path.lexists(staging_path):
+                    util.remove_path(staging_path)
+                os.remove(os.path.join(journal_path, name))
+            except EnvironmentError as _error:
+                raise Error("unable to remove pull staging directory '%s' [%s]" % (journal['path'], _error))
+
+    def _establish_invariants(self, uuids=None, workers=None):
+        """Remove (or strip) products according to the cascade rules of their product type. If uuids is not None, only
+        the specified products are considered.
+
+        """
+        if uuids is not None and not uuids:
+            return
+
         repeat = True
         cycle = 0
         while repeat and cycle < self._max_cascade_cycles:
@@ -188,50 +425,112 @@ class Archive(object):
                     continue
 
                 strip = cascade_rule in (CascadeRule.CASCADE_PURGE_AS_STRIP, CascadeRule.STRIP)
-                products = self._backend.find_products_without_source(product_type, self._cascade_grace_period, strip)
+                products = self._backend.find_products_without_source(product_type, self._cascade_grace_period, strip,
+                                                                      uuids)
                 if products:
                     repeat = True
 
                 if strip:
-                    for product in products:
-                        self._strip(product)
+                    self._strip(products, workers)
                 else:
-                    for product in products:
-                        self._purge(product)
+                    self._purge(products, workers)
 
                 if cascade_rule in (CascadeRule.CASCADE_PURGE_AS_STRIP, CascadeRule.CASCADE_PURGE):
                     continue
 
-                products = self._backend.find_products_without_available_source(product_type)
+                products = self._backend.find_products_without_available_source(product_type, uuids=uuids)
                 if products:
                     repeat = True
 
                 if cascade_rule in (CascadeRule.STRIP, CascadeRule.CASCADE):
-                    for product in products:
-                        self._strip(product)
+                    self._strip(products, workers)
                 else:
-                    for product in products:
-                        self._purge(product)
+                    self._purge(products, workers)
+
+    def _export_products(self, products, target_path, format=None):
+        export_method_name = "export"
+        if format is not None:
+            if re.match("[a-zA-Z]\\w*$", format) is None:
+                raise Error("invalid export format '%s'" % format)
+            export_method_name = export_method_name + "_" + format
+
+        result = []
+        for product in products:
+            if not product.core.active:
+                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
+
+            # Use the format specific export_<format>() method from the product type plug-in, or the default export()
+            # method if no format was specified. Call self._retrieve() as a fall back if the product type plug-in does
+            # not define its own export() method.
+            #
+            # Note the use of getattr() / hasattr() instead of a try + except AttributeError block, to avoid hiding
+            # AttributeError instances raised by the plug-in.
+            plugin = self.product_type_plugin(product.core.product_type)
+
+            export_method = getattr(plugin, export_method_name, None)
+            if export_method is not None:
+                exported_path = export_method(self, product, target_path)
+            elif format is not None:
+                raise Error("export format '%s' not supported for product '%s' (%s)" %
+                            (format, product.core.product_name, product.core.uuid))
+            else:
+                exported_path = self._retrieve(product, target_path, False)
+            result.append(exported_path)
+
+        return result
 
     def _get_product(self, uuid):
-        products = self.search('uuid == @uuid', parameters={'uuid': uuid})
+        products = self._backend.search_by_uuids([uuid])
         if len(products) == 0:
             raise Error('No product found with UUID: %s' % uuid)
         assert len(products) == 1
         return products[0]
 
+    def _hash_cache_path(self):
+        return os.path.join(self._root, ".muninn-hash-cache.sqlite")
+
+    def _log_copy_strategies(self, product, strategies):
+        if strategies:
+            logging.debug("product '%s' (%s) copied using copy strategy: %s" %
+                          (product.core.product_name, product.core.uuid, ", ".join(sorted(strategies))))
+
     def _product_path(self, product):
         if getattr(product.core, "archive_path", None) is None:
             return None
 
         return os.path.join(self._root, product.core.archive_path, product.core.physical_name)
 
-    def _purge(self, product):
-        # Remove the product from the product catalogue.
-        self._backend.delete_product_properties(product.core.uuid)
+    def _product_hash(self, paths, digests=None, workers=None):
+        try:
+            return util.product_hash(paths, digests=digests, workers=workers)
+        except EnvironmentError as _error:
+            raise Error("cannot determine product hash [%s]" % (_error,))
 
-        # Remove any data on disk associated with the product.
-        self._remove(product)
+    def _pull_staging_journal_path(self):
+        return os.path.join(self._root, ".pull")
+
+    def _purge(self, products, workers=None):
+        if not products:
+            return
+
+        # Remove the products from the product catalogue.
+        self._backend.delete_product_properties_many([product.core.uuid for product in products])
+
+        # Remove any data on disk associated with the products.
+        self._remove_many(products, workers)
+
+    def _record_pull_staging(self, product, staging_path):
+        """Record a journal entry for the staging directory used to pull a product (see collect_garbage())."""
+        journal_path = self._pull_staging_journal_path()
+        util.make_path(journal_path)
+        journal = {
+            'uuid': str(product.core.uuid),
+            'product_name': product.core.product_name,
+            'path': os.path.relpath(staging_path, self._root),
+            'date': datetime.datetime.utcnow().isoformat(),
+        }
+        with open(os.path.join(journal_path, product.core.uuid.hex + ".json"), "w") as stream:
+            json.dump(journal, stream)
 
     def _relocate(self, product, properties=None):
         """Relocate a product to the archive_path reported by the product type plugin.
@@ -260,6 +559,11 @@ class Archive(object):
             # If the product does not exist, do not consider this an error.
             return
 
+        # Move the data associated with the product into the trash if required. If that is not possible, remove the
+        # data immediately.
+        if self._use_trash and self._trash(product, product_path):
+            return
+
         # Remove the data associated with the product from disk.
         try:
             with util.TemporaryDirectory(prefix=".remove-", suffix="-%s" % product.core.uuid.hex,
@@ -277,6 +581,55 @@ class Archive(object):
             raise Error("unable to remove product '%s' (%s) [%s]" % (product.core.product_name, product.core.uuid,
                                                                      _error))
 
+    def _remove_many(self, products, workers=None):
+        """Remove the data on disk associated with each of the specified products, using a pool of worker threads.
+        Products are removed independently; if the data of one or more products cannot be removed, the first error
+        encountered is raised after all products have been processed.
+
+        """
+        def remove(product):
+            try:
+                self._remove(product)
+            except Error as _error:
+                return _error
+
+        if len(products) == 1 or workers == 1:
+            errors = [remove(product) for product in products]
+        else:
+            pool = multiprocessing.pool.ThreadPool(min(workers or util.default_workers(), len(products)))
+            try:
+                errors = pool.map(remove, products, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+
+        for _error in errors:
+            if _error is not None:
+                raise _error
+
+    def _remove_products(self, products, force=False, workers=None):
+        for product in products:
+            if not product.core.active and not force:
+                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
+
+        # Determine which derived products may have to be removed (or stripped) along with the products.
+        scope = self._cascade_scope(products) if products else None
+
+        self._purge(products, workers)
+
+        # Remove (or strip) derived products if necessary.
+        if len(products) > 0:
+            self._establish_invariants(scope, workers)
+
+        return len(products)
+
+    def _remove_pull_staging_record(self, product):
+        try:
+            os.remove(os.path.join(self._pull_staging_journal_path(), product.core.uuid.hex + ".json"))
+        except EnvironmentError as _error:
+            if _error.errno != errno.ENOENT:
+                raise
+
     def _retrieve(self, product, target_path, use_symlinks=False):
         # Determine the path of the product on disk.
         product_path = self._product_path(product)
@@ -295,11 +648,16 @@ class Archive(object):
                 else:
                     os.symlink(product_path, os.path.join(target_path, os.path.basename(product_path)))
             else:
+                strategies = set()
                 if plugin.use_enclosing_directory:
                     for basename in os.listdir(product_path):
-                        util.copy_path(os.path.join(product_path, basename), target_path, resolve_root=True)
+                        strategies |= util.copy_path(os.path.join(product_path, basename), target_path,
+                                                     resolve_root=True, strategy=self._copy_strategy,
+                                                     workers=self._copy_workers)
                 else:
-                    util.copy_path(product_path, target_path, resolve_root=True)
+                    strategies = util.copy_path(product_path, target_path, resolve_root=True,
+                                                strategy=self._copy_strategy, workers=self._copy_workers)
+                self._log_copy_strategies(product, strategies)
 
         except EnvironmentError as _error:
             raise Error("unable to retrieve product '%s' (%s) [%s]" % (product.core.product_name, product.core.uuid,
@@ -307,13 +665,195 @@ class Archive(object):
 
         return os.path.join(target_path, os.path.basename(product_path))
 
-    def _strip(self, product):
-        # Set the archive path to None to indicate the product has no data on disk associated with it.
-        self.update_properties(Struct({'core': {'active': True, 'archive_path': None, 'archive_date': None}}),
-                               product.core.uuid)
+    def _retrieve_products(self, products, target_path, use_symlinks=False):
+        for product in products:
+            if not product.core.active or 'archive_path' not in product.core:
+                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
 
-        # Remove any data on disk associated with the product.
-        self._remove(product)
+            self._retrieve(product, target_path, use_symlinks)
+
+        return len(products)
+
+    def _strip(self, products, workers=None):
+        if not products:
+            return
+
+        # Set the archive path to None to indicate the products have no data on disk associated with them.
+        metadata_date = self._backend.server_time_utc()
+        self._backend.update_product_properties_many([
+            Struct({'core': {'uuid': product.core.uuid, 'active': True, 'archive_path': None, 'archive_date': None,
+                             'metadata_date': metadata_date}}) for product in products
+        ])
+
+        # Remove any data on disk associated with the products.
+        self._remove_many(products, workers)
+
+    def _strip_products(self, products, force=False, workers=None):
+        # Products that are not stored in the archive (anymore) are silently skipped.
+        products = [product for product in products if 'archive_path' in product.core]
+        for product in products:
+            if not product.core.active and not force:
+                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
+
+        # Determine which derived products may have to be stripped (or removed) along with the products.
+        scope = self._cascade_scope(products) if products else None
+
+        self._strip(products, workers)
+
+        # Strip (or remove) derived products if necessary.
+        if len(products) > 0:
+            self._establish_invariants(scope, workers)
+
+        return len(products)
+
+    def _transfer_product(self, paths, plugin, properties, use_symlinks=None, verify_hash=False,
+                          use_current_path=False, hash_product=False, workers=None):
+        """Transfer a product into the archive (or leave it at its current location if use_current_path is True), and
+        set core.archive_path accordingly.
+
+        If hash_product is True and the product is copied into the archive, the product hash is computed while copying
+        (such that the product is read only once) and core.hash is set accordingly.
+
+        If workers is not None, it overrides the number of worker threads used to copy and hash the files of the
+        product (e.g. when multiple products are transferred in parallel).
+
+        """
+        # Determine the (absolute) path in the archive that will contain the product and create it if required.
+        if use_current_path:
+            for path in paths:
+                if not util.is_sub_path(os.path.realpath(path), self._root, allow_equal=True):
+                    raise Error("cannot ingest a file in-place if it is not inside the muninn archive root")
+            if len(paths) > 1:
+                # check whether all files have the right enclosing directory
+                for path in paths:
+                    enclosing_directory = os.path.basename(os.path.dirname(os.path.realpath(path)))
+                    if enclosing_directory != properties.core.physical_name:
+                        raise Error("multi-part product has invalid enclosing directory for in-place ingestion")
+                # strip the archive root
+                properties.core.archive_path = os.path.relpath(
+                    os.path.dirname(os.path.dirname(os.path.realpath(paths[0]))),
+                    start=os.path.realpath(self._root))
+            else:
+                # strip the archive root
+                properties.core.archive_path = os.path.relpath(
+                    os.path.dirname(os.path.realpath(paths[0])),
+                    start=os.path.realpath(self._root))
+        else:
+            properties.core.archive_path = plugin.archive_path(properties)
+            abs_archive_path = os.path.realpath(os.path.join(self._root, properties.core.archive_path))
+            abs_product_path = os.path.join(abs_archive_path, properties.core.physical_name)
+
+        if not use_current_path:
+            if util.is_sub_path(os.path.realpath(paths[0]), abs_product_path, allow_equal=True):
+                # Product should already be in the target location
+                for path in paths:
+                    if not os.path.exists(path):
+                        raise Error("product source path does not exist '%s'" % (path,))
+                    if not util.is_sub_path(os.path.realpath(path), abs_product_path, allow_equal=True):
+                        raise Error("cannot ingest product where only part of the files are already at the "
+                                    "destination location")
+            else:
+                # Create destination location for product
+                try:
+                    util.make_path(abs_archive_path)
+                except EnvironmentError as _error:
+                    raise Error("cannot create parent destination path '%s' [%s]" % (abs_archive_path, _error))
+
+                # Create a temporary directory and transfer the product there, then move the product to its
+                # destination within the archive.
+                try:
+                    with util.TemporaryDirectory(prefix=".ingest-", suffix="-%s" % properties.core.uuid.hex,
+                                                 dir=abs_archive_path) as tmp_path:
+
+                        # Create enclosing directory if required.
+                        if plugin.use_enclosing_directory:
+                            tmp_path = os.path.join(tmp_path, properties.core.physical_name)
+                            util.make_path(tmp_path)
+
+                        # Transfer the product (parts).
+                        if use_symlinks or use_symlinks is None and self._use_symlinks:
+                            # Create symbolic link(s) for the product (parts).
+                            for path in paths:
+                                if util.is_sub_path(path, self._root):
+                                    # Create a relative symbolic link when the target is part of the archive
+                                    # (i.e. when creating an intra-archive symbolic link). This ensures the
+                                    # archive can be relocated without breaking intra-archive symbolic links.
+                                    os.symlink(os.path.relpath(path, abs_archive_path),
+                                               os.path.join(tmp_path, os.path.basename(path)))
+                                else:
+                                    os.symlink(path, os.path.join(tmp_path, os.path.basename(path)))
+                        else:
+                            # Copy product (parts), computing the digests of the files copied if required.
+                            digests = {} if hash_product else None
+                            strategies = set()
+                            for path in paths:
+                                strategies |= util.copy_path(path, tmp_path, resolve_root=True,
+                                                             strategy=self._copy_strategy,
+                                                             workers=self._copy_workers if workers is None else workers,
+                                                             digests=digests)
+                            self._log_copy_strategies(properties, strategies)
+
+                            # Compute the product hash of the copy from the digests of the files copied. This is
+                            # equal to the hash of the original product.
+                            if hash_product:
+                                properties.core.hash = self._product_hash(
+                                    [os.path.join(tmp_path, os.path.basename(path)) for path in paths], digests,
+                                    workers)
+
+                        # Move the transferred product into its destination within the archive.
+                        if plugin.use_enclosing_directory:
+                            os.rename(tmp_path, abs_product_path)
+                        else:
+                            assert len(paths) == 1 and \
+                                properties.core.physical_name == os.path.basename(paths[0])
+                            tmp_product_path = os.path.join(tmp_path, properties.core.physical_name)
+                            os.rename(tmp_product_path, abs_product_path)
+
+                except EnvironmentError as _error:
+                    raise Error("unable to transfer product to destination path '%s' [%s]" %
+                                (abs_product_path, _error))
+                # Verify product hash after copy
+                if verify_hash and plugin.use_hash:
+                    if properties.core.hash is None:
+                        properties.core.hash = self._product_hash(paths, workers=workers)
+                    if self._calculate_hash(properties, workers=workers) != properties.core.hash:
+                        raise Error("ingested product has incorrect hash")
+
+    def _trash(self, product, product_path):
+        """Move the data on disk associated with a product into the trash, and record a journal entry for it. Return
+        False if the data cannot be moved into the trash because it is located on a different file system than the
+        trash.
+
+        """
+        trash_path = self._trash_path()
+        name = "%s-%s" % (product.core.uuid.hex, uuid.uuid4().hex)
+        try:
+            util.make_path(trash_path)
+            try:
+                os.rename(product_path, os.path.join(trash_path, name))
+            except EnvironmentError as _error:
+                if _error.errno == errno.EXDEV:
+                    return False
+                raise
+
+            # The journal entry is written after the data has been moved, such that entries without a journal entry
+            # can be collected, but journal entries without data never refer to data in the process of being moved.
+            journal = {
+                'uuid': str(product.core.uuid),
+                'product_name': product.core.product_name,
+                'path': os.path.relpath(product_path, self._root),
+                'date': datetime.datetime.utcnow().isoformat(),
+            }
+            with open(os.path.join(trash_path, name + ".json"), "w") as stream:
+                json.dump(journal, stream)
+        except EnvironmentError as _error:
+            raise Error("unable to move product '%s' (%s) into the trash [%s]" % (product.core.product_name,
+                                                                                 product.core.uuid, _error))
+
+        return True
+
+    def _trash_path(self):
+        return os.path.join(self._root, ".trash")
 
     def _update_export_formats(self, plugin):
         # Find all callables of which the name starts with "export_". The remainder of the name is used as the name of
@@ -338,6 +878,27 @@ class Archive(object):
             properties.core = Struct()
         properties.core.metadata_date = self._backend.server_time_utc()
 
+    def _verify_hash(self, products, full=False):
+        failed_products = []
+        cache = util.HashCache(self._hash_cache_path(), refresh=full) if self._use_hash_cache else None
+        try:
+            for product in products:
+                if product.core.active and 'archive_path' in product.core:
+                    if 'hash' not in product.core:
+                        raise Error("no hash available for product '%s' (%s)" %
+                                    (product.core.product_name, product.core.uuid))
+                    try:
+                        product_hash = self._calculate_hash(product, cache)
+                    except (EnvironmentError, sqlite3.Error) as _error:
+                        raise Error("cannot determine hash for product '%s' (%s) [%s]" %
+                                    (product.core.product_name, product.core.uuid, _error))
+                    if product_hash != product.core.hash:
+                        failed_products.append(product.core.uuid)
+        finally:
+            if cache is not None:
+                cache.close()
+        return failed_products
+
     def auth_file(self):
         """Return the path of the authentication file to download from remote locations"""
         return self._auth_file
@@ -350,6 +911,44 @@ class Archive(object):
         """
         self._backend.disconnect()
 
+    def collect_garbage(self):
+        """Permanently remove the product data that has been moved into the trash (see the use_trash archive option).
+        Return the number of products removed from the trash.
+
+        The partial downloads that are kept when a pull fails (such that the pull can be resumed) are removed as well,
+        unless the product is being pulled.
+
+        """
+        self._collect_pull_staging()
+
+        trash_path = self._trash_path()
+        if not os.path.isdir(trash_path):
+            return 0
+
+        count = 0
+        for name in sorted(os.listdir(trash_path)):
+            if name.endswith(".json"):
+                continue
+
+            path = os.path.join(trash_path, name)
+            logging.debug("removing '%s' from the trash", name)
+            try:
+                util.remove_path(path)
+            except EnvironmentError as _error:
+                raise Error("unable to remove '%s' from the trash [%s]" % (name, _error))
+            count += 1
+
+        # Remove the journal entries of the data removed.
+        for name in os.listdir(trash_path):
+            if name.endswith(".json") and not os.path.lexists(os.path.join(trash_path, name[:-len(".json")])):
+                try:
+                    os.remove(os.path.join(trash_path, name))
+                except EnvironmentError as _error:
+                    if _error.errno != errno.ENOENT:
+                        raise Error("unable to remove '%s' from the trash [%s]" % (name, _error))
+
+        return count
+
     def count(self, where="", parameters={}):
         """Return the number of products matching the specified search expression.
 
@@ -360,6 +959,41 @@ class Archive(object):
         """
         return self._backend.count(where, parameters)
 
+    def create_index(self, property_names, dry_run=False):
+        """Create an index on one or more product properties in the product catalogue, to speed up searches that
+        filter or sort on these properties. The index is not created if it already exists.
+
+        Indexes that should always be present are better declared in the namespace definition (see
+        prepare_indexes()).
+
+        Returns the SQL statements that were executed (or would be executed, if dry_run is True).
+
+        Arguments:
+        property_names  --  Name of the property to index, or a list of names for a multi-column index. All
+                            properties should be defined within the same namespace. The namespace prefix defaults to
+                            "core" if omitted.
+
+        Keyword arguments:
+        dry_run         --  If set to True, only return the SQL statements without executing them.
+
+        """
+        if isinstance(property_names, basestring):
+            property_names = [property_names]
+
+        namespaces, names = set(), []
+        for property_name in property_names:
+            namespace, _, name = property_name.rpartition(".")
+            namespaces.add(namespace or "core")
+            names.append(name)
+        if len(namespaces) > 1:
+            raise Error("properties of a multi-column index should be defined within the same namespace")
+        if not namespaces:
+            raise Error("no properties specified")
+
+        if not self._catalogue_exists():
+            raise Error("catalogue does not exist")
+        return self._backend.create_index(namespaces.pop(), names, dry_run=dry_run)
+
     def create_properties(self, properties):
         """ Create record for product in the product catalogue.
             An important side effect of this operation is that it
@@ -404,6 +1038,34 @@ class Archive(object):
         if self._catalogue_exists():
             self._backend.destroy()
 
+    def explain(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                analyze=False, unpack=False):
+        """Explain how a search is performed by the product catalogue. This is useful to find out why a search is slow,
+        e.g. to determine which properties would benefit from an index.
+
+        Returns a Struct with the following fields:
+        query       --  The SQL query that corresponds to the search.
+        parameters  --  The parameters bound to the SQL query.
+        plan        --  The query plan of the database (a list of lines of text).
+        timings     --  An ordered dictionary that contains the time spent (in seconds) on each step of the search:
+                        parsing ("parse") and analyzing ("analyze") the search expression, building the SQL query
+                        ("build") and, if analyze is True, executing the query ("execute") and, if unpack is True,
+                        unpacking the results ("unpack").
+
+        Keyword arguments:
+        analyze     --  If set to True, the query is executed. For the postgresql backend, the query plan then includes
+                        the actual run times and buffer usage of each step of the plan, and the execution time is the
+                        one reported by the database.
+        unpack      --  If set to True (requires analyze), the time spent unpacking the results is included as well.
+                        For the postgresql backend, this executes the query a second time (with a warm cache).
+
+        See search() for a description of the other arguments.
+
+        """
+        if unpack and not analyze:
+            raise Error("unpack requires analyze")
+        return self._backend.explain(where, order_by, limit, parameters, namespaces, property_names, analyze, unpack)
+
     def export(self, where="", parameters={}, target_path=os.path.curdir, format=None):
         """Export one or more products from the archive. Return the list of file paths of the exported products.
 
@@ -418,39 +1080,8 @@ class Archive(object):
         format          --  Format in which the products will be exported.
 
         """
-        export_method_name = "export"
-        if format is not None:
-            if re.match("[a-zA-Z]\\w*$", format) is None:
-                raise Error("invalid export format '%s'" % format)
-            export_method_name = export_method_name + "_" + format
-
-        result = []
-        products = self.search(where=where, parameters=parameters,
-                               property_names=['uuid', 'active', 'product_type', 'product_name', 'archive_path',
-                                               'physical_name'])
-        for product in products:
-            if not product.core.active:
-                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
-
-            # Use the format specific export_<format>() method from the product type plug-in, or the default export()
-            # method if no format was specified. Call self._retrieve() as a fall back if the product type plug-in does
-            # not define its own export() method.
-            #
-            # Note the use of getattr() / hasattr() instead of a try + except AttributeError block, to avoid hiding
-            # AttributeError instances raised by the plug-in.
-            plugin = self.product_type_plugin(product.core.product_type)
-
-            export_method = getattr(plugin, export_method_name, None)
-            if export_method is not None:
-                exported_path = export_method(self, product, target_path)
-            elif format is not None:
-                raise Error("export format '%s' not supported for product '%s' (%s)" %
-                            (format, product.core.product_name, product.core.uuid))
-            else:
-                exported_path = self._retrieve(product, target_path, False)
-            result.append(exported_path)
-
-        return result
+        products = self.search(where=where, parameters=parameters, property_names=_ACCESS_PROPERTY_NAMES)
+        return self._export_products(products, target_path, format)
 
     def export_by_name(self, product_name, target_path=os.path.curdir, format=None):
         """Export one or more products from the archive by name.
@@ -465,7 +1096,8 @@ class Archive(object):
         An exception will be raised if no products with the specified name can be found.
 
         """
-        paths = self.export("product_name == @product_name", {"product_name": product_name}, target_path, format)
+        products = self._backend.search_by_name(product_name, property_names=_ACCESS_PROPERTY_NAMES)
+        paths = self._export_products(products, target_path, format)
         if not paths:
             raise Error("no products found with name '%s'" % product_name)
         return paths
@@ -480,7 +1112,8 @@ class Archive(object):
         An exception will be raised if no product with the specified uuid can be found.
 
         """
-        paths = self.export("uuid == @uuid", {"uuid": uuid}, target_path, format)
+        products = self._backend.search_by_uuids([uuid], property_names=_ACCESS_PROPERTY_NAMES)
+        paths = self._export_products(products, target_path, format)
         if not paths:
             raise Error("product with uuid '%s' not found" % uuid)
         return paths
@@ -503,6 +1136,24 @@ class Archive(object):
         """Return a new generated UUID that can be used as UUID for a product metadata record"""
         return uuid.uuid4()
 
+    def get_many(self, uuids, namespaces=[], property_names=[]):
+        """Retrieve the properties of multiple products by uuid, using as few queries as possible. Return a dictionary
+        that maps uuid to product properties. Products that cannot be found are not included.
+
+        Keyword arguments:
+        namespaces      --  List of namespaces of which the properties should be retrieved. By default, only properties
+                            defined in the "core" namespace will be retrieved.
+        property_names  --  List of property names that should be returned. By default all properties of the "core"
+                            namespace and those of the namespaces in the namespaces argument are included. The uuid of
+                            each product is always included.
+
+        """
+        if property_names:
+            property_names = ["core.uuid"] + list(property_names)
+
+        products = self._backend.search_by_uuids(uuids, namespaces, property_names)
+        return dict((product.core.uuid, product) for product in products)
+
     def identify(self, paths):
         """Determine the product type of the product (specified as a single path, or a list of paths if it is a
         multi-part product).
@@ -551,172 +1202,33 @@ class Archive(object):
                             or more derived products being removed (or stripped) along with it.
 
         """
-        if isinstance(paths, basestring):
-            paths = [paths]
-
-        if not paths:
-            raise Error("nothing to ingest")
-
         if not os.path.isdir(self._root):
             raise Error("archive root path '%s' does not exist" % self._root)
 
-        # Use absolute paths to make error messages more useful, and to avoid broken links when ingesting a product
-        # using symbolic links.
-        paths = [os.path.realpath(path) for path in paths]
-
-        # Ensure that the set of files and / or directories that make up the product does not contain duplicate
-        # basenames.
-        if util.contains_duplicates([os.path.basename(path) for path in paths]):
-            raise Error("basename of each part should be unique for multi-part products")
-
-        # Get the product type plug-in.
-        if product_type is None:
-            product_type = self.identify(paths)
-        plugin = self.product_type_plugin(product_type)
-
-        # Extract product metadata.
-        if properties is None:
-            metadata = plugin.analyze(paths)
-            if isinstance(metadata, (tuple, list)):
-                properties, tags = metadata
-            else:
-                properties, tags = metadata, []
-        else:
-            properties, tags = copy.deepcopy(properties), []
-
-        assert properties is not None and "core" in properties
-        assert "product_name" in properties.core and properties.core.product_name, \
-            "product_name is required in core.properties"
-
-        # Set core product properties that are not determined by the plugin.
-        # Note that metadata_date is set automatically by create_properties()
-        # and archive_date is properly set when we activate the product.
-        properties.core.uuid = self.generate_uuid()
-        properties.core.active = False
-        properties.core.hash = None
-        properties.core.size = util.product_size(paths)
-        properties.core.metadata_date = None
-        properties.core.archive_date = None
-        properties.core.archive_path = None
-        properties.core.product_type = product_type
-        properties.core.physical_name = None
-
-        # Determine physical product name.
-        if plugin.use_enclosing_directory:
-            properties.core.physical_name = plugin.enclosing_directory(properties)
-        elif len(paths) == 1:
-            properties.core.physical_name = os.path.basename(paths[0])
-        else:
-            raise Error("cannot determine physical name for multi-part product")
+        paths, plugin, properties, tags = self._analyze_product(paths, product_type, properties)
 
         # Remove existing product with the same product type and name before ingesting
         if force:
-            self.remove(where="core.product_type == @product_type and core.product_name == @product_name",
-                        parameters={'product_type': properties.core.product_type,
-                                    'product_name': properties.core.product_name}, force=True)
+            self._remove_products(self._backend.search_by_name(properties.core.product_name,
+                                                               properties.core.product_type,
+                                                               property_names=_ACCESS_PROPERTY_NAMES), force=True)
 
         self.create_properties(properties)
 
-        # Try to determine the product hash and ingest the product into the archive.
+        # Try to ingest the product into the archive and determine the product hash. Since it is an expensive
+        # operation, the hash is computed after inserting the product properties so we won't needlessly compute it for
+        # products that fail ingestion into the catalogue.
         try:
-            # Determine product hash. Since it is an expensive operation, the hash is computed after inserting the
-            # product properties so we won't needlessly compute it for products that fail ingestion into the catalogue.
-            if plugin.use_hash:
-                try:
-                    properties.core.hash = util.product_hash(paths)
-                except EnvironmentError as _error:
-                    raise Error("cannot determine product hash [%s]" % (_error,))
-                # Update the product hash in the product catalogue.
-                self.update_properties(Struct({'core': {'hash': properties.core.hash}}), properties.core.uuid)
-
-            # Ingest the product into the archive.
+            # Ingest the product into the archive. If the product is copied, the product hash is computed while
+            # copying.
             if ingest_product:
-                # Determine the (absolute) path in the archive that will contain the product and create it if required.
-                if use_current_path:
-                    for path in paths:
-                        if not util.is_sub_path(os.path.realpath(path), self._root, allow_equal=True):
-                            raise Error("cannot ingest a file in-place if it is not inside the muninn archive root")
-                    if len(paths) > 1:
-                        # check whether all files have the right enclosing directory
-                        for path in paths:
-                            enclosing_directory = os.path.basename(os.path.dirname(os.path.realpath(path)))
-                            if enclosing_directory != properties.core.physical_name:
-                                raise Error("multi-part product has invalid enclosing directory for in-place ingestion")
-                        # strip the archive root
-                        properties.core.archive_path = os.path.relpath(
-                            os.path.dirname(os.path.dirname(os.path.realpath(paths[0]))),
-                            start=os.path.realpath(self._root))
-                    else:
-                        # strip the archive root
-                        properties.core.archive_path = os.path.relpath(
-                            os.path.dirname(os.path.realpath(paths[0])),
-                            start=os.path.realpath(self._root))
-                else:
-                    properties.core.archive_path = plugin.archive_path(properties)
-                    abs_archive_path = os.path.realpath(os.path.join(self._root, properties.core.archive_path))
-                    abs_product_path = os.path.join(abs_archive_path, properties.core.physical_name)
-
-                if not use_current_path:
-                    if util.is_sub_path(os.path.realpath(paths[0]), abs_product_path, allow_equal=True):
-                        # Product should already be in the target location
-                        for path in paths:
-                            if not os.path.exists(path):
-                                raise Error("product source path does not exist '%s'" % (path,))
-                            if not util.is_sub_path(os.path.realpath(path), abs_product_path, allow_equal=True):
-                                raise Error("cannot ingest product where only part of the files are already at the "
-                                            "destination location")
-                    else:
-                        # Create destination location for product
-                        try:
-                            util.make_path(abs_archive_path)
-                        except EnvironmentError as _error:
-                            raise Error("cannot create parent destination path '%s' [%s]" % (abs_archive_path, _error))
-
-                        # Create a temporary directory and transfer the product there, then move the product to its
-                        # destination within the archive.
-                        try:
-                            with util.TemporaryDirectory(prefix=".ingest-", suffix="-%s" % properties.core.uuid.hex,
-                                                         dir=abs_archive_path) as tmp_path:
-
-                                # Create enclosing directory if required.
-                                if plugin.use_enclosing_directory:
-                                    tmp_path = os.path.join(tmp_path, properties.core.physical_name)
-                                    util.make_path(tmp_path)
-
-                                # Transfer the product (parts).
-                                if use_symlinks or use_symlinks is None and self._use_symlinks:
-                                    # Create symbolic link(s) for the product (parts).
-                                    for path in paths:
-                                        if util.is_sub_path(path, self._root):
-                                            # Create a relative symbolic link when the target is part of the archive
-                                            # (i.e. when creating an intra-archive symbolic link). This ensures the
-                                            # archive can be relocated without breaking intra-archive symbolic links.
-                                            os.symlink(os.path.relpath(path, abs_archive_path),
-                                                       os.path.join(tmp_path, os.path.basename(path)))
-                                        else:
-                                            os.symlink(path, os.path.join(tmp_path, os.path.basename(path)))
-                                else:
-                                    # Copy product (parts).
-                                    for path in paths:
-                                        util.copy_path(path, tmp_path, resolve_root=True)
-
-                                # Move the transferred product into its destination within the archive.
-                                if plugin.use_enclosing_directory:
-                                    os.rename(tmp_path, abs_product_path)
-                                else:
-                                    assert len(paths) == 1 and \
-                                        properties.core.physical_name == os.path.basename(paths[0])
-                                    tmp_product_path = os.path.join(tmp_path, properties.core.physical_name)
-                                    os.rename(tmp_product_path, abs_product_path)
-
-                        except EnvironmentError as _error:
-                            raise Error("unable to transfer product to destination path '%s' [%s]" %
-                                        (abs_product_path, _error))
-                        # Verify product hash after copy
-                        if verify_hash:
-                            if self.verify_hash("uuid == @uuid", {"uuid": properties.core.uuid}):
-                                raise Error("ingested product has incorrect hash")
+                self._transfer_product(paths, plugin, properties, use_symlinks, verify_hash, use_current_path,
+                                       hash_product=plugin.use_hash)
                 properties.core.archive_date = self._backend.server_time_utc()
+
+            # Determine product hash (if not already determined while copying).
+            if plugin.use_hash and properties.core.hash is None:
+                properties.core.hash = self._product_hash(paths)
         except:
             # Try to remove the entry for this product from the product catalogue.
             self._backend.delete_product_properties(properties.core.uuid)
@@ -726,6 +1238,7 @@ class Archive(object):
         properties.core.active = True
         metadata = {
             'active': properties.core.active,
+            'hash': properties.core.hash,
             'archive_date': properties.core.archive_date,
             'archive_path': properties.core.archive_path,
         }
@@ -743,6 +1256,185 @@ class Archive(object):
 
         return properties
 
+    def ingest_many(self, paths_list, product_type=None, ingest_product=True, use_symlinks=None, verify_hash=False,
+                    use_current_path=False, tags=None, workers=None, batch_size=1000):
+        """Ingest multiple products into the archive. Each item of paths_list specifies a single product, as either a
+        single path or a list of paths (multi-part product).
+
+        This function is equivalent to calling ingest() for each product, but is much faster for large numbers of
+        products. Products are analyzed, hashed, and transferred into the archive in parallel using a pool of worker
+        threads, and the product catalogue is updated in batches, using a single transaction per batch for each step
+        of the ingestion.
+
+        Products are ingested independently, i.e. failure to ingest a product does not affect the ingestion of the
+        other products. Returns a list that contains an item for each item of paths_list (in the same order): either
+        the properties of the ingested product, or the exception that caused the ingestion of the product to fail.
+
+        Keyword arguments:
+        product_type     -- Product type of the products to ingest. By default, the product type of each product will
+                            be determined automatically.
+        ingest_product   -- If set to False, the products themselves will not be ingested into the archive, only their
+                            properties. By default, the products will be ingested.
+        use_symlinks     -- If set to True, symbolic links to the original products will be stored in the archive
+                            instead of a copy of the original products. By default, the archive configuration will be
+                            used.
+        verify_hash      -- If set to True then, after the ingestion, each product in the archive will be matched
+                            against the hash from the metadata (only if the metadata contained a hash).
+        use_current_path -- Ingest the products by keeping the file(s) at the current path (which must be inside the
+                            root directory of the archive).
+        tags             -- Additional tags to set on each ingested product.
+        workers          -- Number of worker threads. By default, the number of CPUs is used.
+        batch_size       -- Maximum number of products to process per batch.
+
+        """
+        if not os.path.isdir(self._root):
+            raise Error("archive root path '%s' does not exist" % self._root)
+
+        if batch_size < 1:
+            raise Error("batch size should be at least 1")
+
+        paths_list = list(paths_list)
+        results = [None] * len(paths_list)
+
+        # Products are processed in parallel by the worker threads, so the files of each product are copied and hashed
+        # by a single thread (instead of starting a pool of threads for each product).
+        def prepare(index):
+            try:
+                paths, plugin, properties, product_tags = self._analyze_product(paths_list[index], product_type)
+                # If products are ingested, the product hash is determined during the transfer.
+                if plugin.use_hash and not ingest_product:
+                    properties.core.hash = self._product_hash(paths, workers=1)
+            except Exception as _error:
+                return index, _error
+            return index, (paths, plugin, properties, list(product_tags) + list(tags or []))
+
+        def transfer(item):
+            index, (paths, plugin, properties, _) = item
+            try:
+                self._transfer_product(paths, plugin, properties, use_symlinks, verify_hash, use_current_path,
+                                       hash_product=plugin.use_hash, workers=1)
+                if plugin.use_hash and properties.core.hash is None:
+                    properties.core.hash = self._product_hash(paths, workers=1)
+            except Exception as _error:
+                return index, _error
+            return index, None
+
+        def activation_properties(item):
+            core = item[1][2].core
+            return Struct({'core': {'uuid': core.uuid, 'active': core.active, 'hash': core.hash,
+                                    'archive_date': core.archive_date, 'archive_path': core.archive_path,
+                                    'metadata_date': core.metadata_date}})
+
+        def apply_many(func_many, func, items, arguments):
+            # Try to process all items in a single transaction. If that fails, fall back to processing the items one by
+            # one, to determine which items failed.
+            try:
+                func_many([arguments(item) for item in items])
+                return items
+            except Error:
+                succeeded = []
+                for item in items:
+                    try:
+                        func(arguments(item))
+                    except Error as _error:
+                        results[item[0]] = _error
+                    else:
+                        succeeded.append(item)
+                return succeeded
+
+        pool = multiprocessing.pool.ThreadPool(workers)
+        try:
+            for start in range(0, len(paths_list), batch_size):
+                # Analyze and hash the products.
+                products = []
+                for index, result in pool.imap_unordered(prepare, range(start, min(start + batch_size,
+                                                                                   len(paths_list)))):
+                    if isinstance(result, Exception):
+                        results[index] = result
+                    else:
+                        products.append((index, result))
+                if not products:
+                    continue
+                products.sort(key=lambda item: item[0])
+
+                # Create the catalogue entries.
+                metadata_date = self._backend.server_time_utc()
+                for _, (_, _, properties, _) in products:
+                    properties.core.metadata_date = metadata_date
+                products = apply_many(self._backend.insert_product_properties_many,
+                                      self._backend.insert_product_properties, products, lambda item: item[1][2])
+                if not products:
+                    continue
+
+                # Transfer the products into the archive.
+                if ingest_product:
+                    failed = {}
+                    for index, _error in pool.imap_unordered(transfer, products):
+                        if _error is not None:
+                            failed[index] = _error
+                    for index, (_, _, properties, _) in products:
+                        if index in failed:
+                            results[index] = failed[index]
+                            try:
+                                # Try to remove the entry for this product from the product catalogue.
+                                self._backend.delete_product_properties(properties.core.uuid)
+                            except Error:
+                                pass
+                    products = [item for item in products if item[0] not in failed]
+                    if not products:
+                        continue
+
+                    archive_date = self._backend.server_time_utc()
+                    for _, (_, _, properties, _) in products:
+                        properties.core.archive_date = archive_date
+
+                # Activate the products.
+                metadata_date = self._backend.server_time_utc()
+                for _, (_, _, properties, _) in products:
+                    properties.core.active = True
+                    properties.core.metadata_date = metadata_date
+
+                products = apply_many(self._backend.update_product_properties_many,
+                                      self._backend.update_product_properties, products, activation_properties)
+
+                # Set product tags.
+                products = apply_many(self._backend.tag_many, lambda uuid_tags: self._backend.tag(*uuid_tags),
+                                      products, lambda item: (item[1][2].core.uuid, item[1][3]))
+
+                # Run the post ingest hooks (if defined by the product type plug-in).
+                for index, (_, plugin, properties, _) in products:
+                    if hasattr(plugin, "post_ingest_hook"):
+                        try:
+                            plugin.post_ingest_hook(self, properties)
+                        except Exception as _error:
+                            results[index] = _error
+                            continue
+                    results[index] = properties
+        finally:
+            pool.close()
+            pool.join()
+
+        return results
+
+    def iter_search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                    batch_size=1000, compact=False):
+        """Search the product catalogue for products matching the specified search expression, and return an iterator
+        over the products found. Contrary to search(), products are retrieved from the product catalogue in batches
+        while iterating, such that large search results do not have to fit in memory.
+
+        The connection to the product catalogue is in use until iteration has finished (or the iterator is discarded).
+        Other operations on the product catalogue should therefore not be performed using the same archive instance
+        while iterating.
+
+        Keyword arguments:
+        batch_size  --  Number of products to retrieve from the product catalogue at a time.
+
+        See search() for a description of the other arguments.
+
+        """
+        return self._backend.iter_search(where, order_by, limit, parameters, namespaces, property_names, batch_size,
+                                         compact=compact)
+
     def link(self, uuid_, source_uuids):
         """Link a product to one or more source products."""
         if isinstance(source_uuids, uuid.UUID):
@@ -796,6 +1488,18 @@ class Archive(object):
         """
         return self._backend.prepare(dry_run=dry_run)
 
+    def prepare_indexes(self, dry_run=False):
+        """Create the indexes declared by the namespaces (via the '_indexes' attribute of a namespace definition) that
+        are not yet present in the product catalogue. This can be used to add indexes to an existing catalogue after
+        a namespace definition has been updated.
+
+        Returns the SQL statements that were executed (or would be executed, if dry_run is True).
+
+        """
+        if not self._catalogue_exists():
+            raise Error("catalogue does not exist")
+        return self._backend.prepare_indexes(dry_run=dry_run)
+
     def product_path(self, uuid_or_name_or_properties):
         """Return the path on disk where the product with the specified product.
         Product can be specified by either: uuid, product name or product properties.
@@ -803,16 +1507,15 @@ class Archive(object):
         if isinstance(uuid_or_name_or_properties, Struct):
             product = uuid_or_name_or_properties
         elif isinstance(uuid_or_name_or_properties, uuid.UUID):
-            products = self.search(where="uuid == @uuid", parameters={"uuid": uuid_or_name_or_properties},
-                                   property_names=['archive_path', 'physical_name'])
+            products = self._backend.search_by_uuids([uuid_or_name_or_properties],
+                                                     property_names=['archive_path', 'physical_name'])
             if len(products) == 0:
                 raise Error("product with uuid '%s' not found" % uuid_or_name_or_properties)
             assert len(products) == 1
             product = products[0]
         else:
-            products = self.search(where="product_name == @product_name",
-                                   parameters={"product_name": uuid_or_name_or_properties},
-                                   property_names=['archive_path', 'physical_name'])
+            products = self._backend.search_by_name(uuid_or_name_or_properties,
+                                                    property_names=['archive_path', 'physical_name'])
             if len(products) == 0:
                 raise Error("product with name '%s' not found" % uuid_or_name_or_properties)
             if len(products) != 1:
@@ -832,22 +1535,42 @@ class Archive(object):
         """Return a list of supported product types."""
         return list(self._product_type_plugins.keys())
 
-    def pull(self, where="", parameters={}, verify_hash=False):
+    def pull(self, where="", parameters={}, verify_hash=False, workers=1, max_per_host=None):
         """Pull one or more remote products into the archive.
         Return the number of products pulled.
 
         Products should have a valid remote_url core metadata field and they should not yet exist in the local
         archive (i.e. the archive_path core metadata field should not be set).
 
+        Products are downloaded using a pool of worker threads. The product catalogue is only updated from the calling
+        thread; each product is deactivated just before its download is started and reactivated as soon as its download
+        has completed. If a product fails to download, no new downloads are started, the downloads in progress are
+        completed, and the error is raised. The same applies if the pull is interrupted (e.g. by a KeyboardInterrupt);
+        any product that has not been downloaded completely is reset to its state before the pull.
+
         Keyword arguments:
         where         --  Search expression.
         parameters    --  Parameters referenced in the search expression (if any).
         verify_hash   --  If set to True then, after the pull, the product in the archive will be matched against
                           the hash from the metadata (only if the metadata contained a hash).
+        workers       --  Maximum number of products to download concurrently.
+        max_per_host  --  Maximum number of products to download concurrently from a single host. By default, the
+                          number of downloads per host is only limited by the number of workers.
 
         """
-        queue = self.search(where=where, parameters=parameters)
-        for product in queue:
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            raise Error("number of workers %r should be an integer" % (workers,))
+        if workers < 1:
+            raise Error("number of workers should be at least 1")
+        if max_per_host is not None and max_per_host < 1:
+            raise Error("maximum number of downloads per host should be at least 1")
+
+        def host(product):
+            return urlparse(getattr(product.core, 'remote_url', '')).hostname or ''
+
+        def prepare(product):
             if not product.core.active:
                 raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
             if 'archive_path' in product.core:
@@ -864,32 +1587,148 @@ class Archive(object):
             metadata = {'active': False, 'archive_path': product.core.archive_path}
             self.update_properties(Struct({'core': metadata}), product.core.uuid)
 
-            # pull product
+        def download(product):
             try:
-                remote.pull(self, product)
-            except:
-                # reset active/archive_path values
-                metadata = {'active': True, 'archive_path': None}
-                self.update_properties(Struct({'core': metadata}), product.core.uuid)
-                raise
+                verified = remote.pull(self, product, verify_hash)
+            except Exception as _error:
+                return product, _error
+            return product, verified
+
+        def abort(product):
+            # reset active/archive_path values
+            metadata = {'active': True, 'archive_path': None}
+            self.update_properties(Struct({'core': metadata}), product.core.uuid)
 
+        def finish(product, verified):
             # reactivate and update size
             size = util.product_size(self._product_path(product))
             metadata = {'active': True, 'archive_date': self._backend.server_time_utc(), 'size': size}
             self.update_properties(Struct({'core': metadata}), product.core.uuid)
 
-            # verify product hash.
-            if verify_hash and 'hash' in product.core:
-                if self.verify_hash("uuid == @uuid", {"uuid": product.core.uuid}):
+            # verify product hash (if not already verified while pulling).
+            if verify_hash and 'hash' in product.core and not verified:
+                if self._verify_hash(self._backend.search_by_uuids([product.core.uuid],
+                                                                   property_names=_VERIFY_PROPERTY_NAMES)):
                     raise Error("pulled product '%s' (%s) has incorrect hash" %
                                 (product.core.product_name, product.core.uuid))
 
             # Run the post pull hook (if defined by the product type plug-in).
+            plugin = self.product_type_plugin(product.core.product_type)
             if hasattr(plugin, "post_pull_hook"):
                 plugin.post_pull_hook(self, product)
 
+        queue = self.search(where=where, parameters=parameters)
+
+        if workers == 1:
+            for product in queue:
+                prepare(product)
+                try:
+                    verified = remote.pull(self, product, verify_hash)
+                except:
+                    abort(product)
+                    raise
+                finish(product, verified)
+            return len(queue)
+
+        # Group the products by host (in search order), such that downloads from other hosts can be started when the
+        # maximum number of concurrent downloads from a host has been reached.
+        waiting = collections.OrderedDict()
+        for product in queue:
+            waiting.setdefault(host(product), collections.deque()).append(product)
+
+        running = collections.defaultdict(int)
+        num_running = 0
+        completed = Queue()
+        error = None
+
+        # Products for which the download has been started, but that have not been finished or aborted yet (by uuid).
+        started = {}
+
+        def abort_started():
+            # Wait for the downloads in progress. Finish the products that have been downloaded completely and abort
+            # all other started products, such that no product is left deactivated.
+            pool.close()
+            pool.join()
+            while not completed.empty():
+                product, result = completed.get()
+                if not isinstance(result, Exception):
+                    del started[product.core.uuid]
+                    try:
+                        finish(product, result)
+                    except Exception as _error:
+                        logging.warning("unable to finish pulled product '%s' (%s): %s" %
+                                        (product.core.product_name, product.core.uuid, _error))
+            for product in started.values():
+                try:
+                    abort(product)
+                except Exception as _error:
+                    logging.warning("unable to abort pull of product '%s' (%s): %s" %
+                                    (product.core.product_name, product.core.uuid, _error))
+
+        pool = multiprocessing.pool.ThreadPool(workers)
+        try:
+            while True:
+                # Start downloads while there are idle workers and products from hosts that are below their limit.
+                while error is None and num_running < workers:
+                    product = None
+                    for products in waiting.values():
+                        if products and (max_per_host is None or running[host(products[0])] < max_per_host):
+                            product = products.popleft()
+                            break
+                    if product is None:
+                        break
+
+                    try:
+                        prepare(product)
+                    except Exception as _error:
+                        error = _error
+                        break
+
+                    started[product.core.uuid] = product
+                    running[host(product)] += 1
+                    num_running += 1
+                    pool.apply_async(download, (product,), callback=completed.put)
+
+                if num_running == 0:
+                    break
+
+                # Wait for a download to complete and update the product catalogue accordingly.
+                product, result = completed.get()
+                running[host(product)] -= 1
+                num_running -= 1
+
+                _error = None
+                if isinstance(result, Exception):
+                    _error = result
+                    abort(product)
+                else:
+                    try:
+                        finish(product, result)
+                    except Exception as _finish_error:
+                        _error = _finish_error
+                del started[product.core.uuid]
+
+                if _error is not None and error is None:
+                    error = _error
+        except BaseException:
+            abort_started()
+            raise
+        finally:
+            pool.close()
+            pool.join()
+
+        if error is not None:
+            raise error
+
         return len(queue)
 
+    def query_cache_info(self):
+        """Return statistics of the cache of compiled search expressions used by the backend, as a named tuple with
+        fields hits, misses, maxsize, and currsize.
+
+        """
+        return self._backend.query_cache_info()
+
     def rebuild_properties(self, uuid, disable_hooks=False, use_current_path=False):
         """Rebuilds product properties by re-extracting these properties (using product type plug-ins) from the
         products stored in the archive.
@@ -993,7 +1832,8 @@ class Archive(object):
 
         # verify product hash.
         if verify_hash and 'hash' in product.core:
-            if self.verify_hash("uuid == @uuid", {"uuid": product.core.uuid}):
+            if self._verify_hash(self._backend.search_by_uuids([product.core.uuid],
+                                                               property_names=_VERIFY_PROPERTY_NAMES)):
                 raise Error("pulled product '%s' (%s) has incorrect hash" %
                             (product.core.product_name, product.core.uuid))
 
@@ -1067,7 +1907,7 @@ class Archive(object):
         """Return a list of supported remote_backends."""
         return list(self._remote_backend_plugins.keys())
 
-    def remove(self, where="", parameters={}, force=False):
+    def remove(self, where="", parameters={}, force=False, workers=None):
         """Remove one or more products from the archive, both from disk as well as from the product catalogue. Return
         the number of products removed.
 
@@ -1080,20 +1920,11 @@ class Archive(object):
         force       --  If set to True, also remove partially ingested products. This affects products for which a
                         failure occured during ingestion, as well as products in the process of being ingested. Use
                         this option with care.
+        workers     --  Number of worker threads used to remove products from disk. By default, the number of CPUs is
+                        used.
         """
-        products = self.search(where=where, parameters=parameters,
-                               property_names=['uuid', 'active', 'product_name', 'archive_path', 'physical_name'])
-        for product in products:
-            if not product.core.active and not force:
-                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
-
-            self._purge(product)
-
-        # Remove (or strip) derived products if necessary.
-        if len(products) > 0:
-            self._establish_invariants()
-
-        return len(products)
+        products = self.search(where=where, parameters=parameters, property_names=_ACCESS_PROPERTY_NAMES)
+        return self._remove_products(products, force, workers)
 
     def remove_by_name(self, product_name, force=False):
         """Remove one or more products from the archive by name.
@@ -1108,7 +1939,8 @@ class Archive(object):
         An exception will be raised if no products with the specified name can be found.
 
         """
-        count = self.remove("product_name == @product_name", {"product_name": product_name}, force)
+        products = self._backend.search_by_name(product_name, property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._remove_products(products, force)
         if count == 0:
             raise Error("no products found with name '%s'" % product_name)
         return count
@@ -1123,7 +1955,8 @@ class Archive(object):
         An exception will be raised if no product with the specified uuid can be found.
 
         """
-        count = self.remove("uuid == @uuid", {"uuid": uuid}, force)
+        products = self._backend.search_by_uuids([uuid], property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._remove_products(products, force)
         if count == 0:
             raise Error("product with uuid '%s' not found" % uuid)
         return count
@@ -1140,16 +1973,8 @@ class Archive(object):
                             By default, products will be retrieved as copies.
 
         """
-        products = self.search(where=where, parameters=parameters,
-                               property_names=['uuid', 'active', 'product_type', 'product_name', 'archive_path',
-                                               'physical_name'])
-        for product in products:
-            if not product.core.active or 'archive_path' not in product.core:
-                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
-
-            self._retrieve(product, target_path, use_symlinks)
-
-        return len(products)
+        products = self.search(where=where, parameters=parameters, property_names=_ACCESS_PROPERTY_NAMES)
+        return self._retrieve_products(products, target_path, use_symlinks)
 
     def retrieve_by_name(self, product_name, target_path=os.path.curdir, use_symlinks=False):
         """Retrieve a product from the archive by name.
@@ -1164,8 +1989,8 @@ class Archive(object):
         An exception will be raised if no products with the specified name can be found.
 
         """
-        count = self.retrieve("product_name == @product_name", {"product_name": product_name}, target_path,
-                              use_symlinks)
+        products = self._backend.search_by_name(product_name, property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._retrieve_products(products, target_path, use_symlinks)
         if count == 0:
             raise Error("no products found with name '%s'" % product_name)
         return count
@@ -1180,7 +2005,8 @@ class Archive(object):
         An exception will be raised if no product with the specified uuid can be found.
 
         """
-        count = self.retrieve("uuid == @uuid", {"uuid": uuid}, target_path, use_symlinks)
+        products = self._backend.search_by_uuids([uuid], property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._retrieve_products(products, target_path, use_symlinks)
         if count == 0:
             raise Error("product with uuid '%s' not found" % uuid)
         return count
@@ -1193,8 +2019,7 @@ class Archive(object):
                         defined in the "core" namespace will be retrieved.
 
         """
-        products = self.search(where="uuid == @uuid", parameters={"uuid": uuid}, namespaces=namespaces,
-                               property_names=property_names)
+        products = self._backend.search_by_uuids([uuid], namespaces, property_names)
         assert len(products) <= 1
 
         if len(products) == 0:
@@ -1206,7 +2031,8 @@ class Archive(object):
         """Return the archive root path."""
         return self._root
 
-    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[]):
+    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[], after=None,
+               compact=False):
         """Search the product catalogue for products matching the specified search expression.
 
         Keyword arguments:
@@ -1226,14 +2052,126 @@ class Archive(object):
                         Properties are specified as '<namespace>.<identifier>'
                         (the namespace can be omitted for the 'core' namespace).
                         If the property_names parameter is provided then the namespaces parameter is ignored.
+        after       --  Continuation token as returned by search_page(). If specified, only products that come after
+                        the position identified by the token are returned, see search_page().
+        compact     --  If set to True, products are returned as compact, read-only Row instances instead of Struct
+                        instances. Rows support the same (attribute and item) access to properties as Struct, and can
+                        be converted to a Struct using Row.to_struct(). Rows take less memory and are faster to
+                        create, because they share a single description of the result and the values are not
+                        validated against the namespace schemas. This is useful for large search results.
         """
-        return self._backend.search(where, order_by, limit, parameters, namespaces, property_names)
+        if after is not None:
+            after = _decode_page_token(after, self._backend.keyset_order_by(order_by))
+
+        return self._backend.search(where, order_by, limit, parameters, namespaces, property_names, after,
+                                    compact=compact)
+
+    def search_columns(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                       batch_size=1000):
+        """Search the product catalogue for products matching the specified search expression, and return the
+        properties of the products found as columns. This function requires numpy.
+
+        The result is an ordered dictionary that maps property names ("<namespace>.<identifier>") to NumPy arrays.
+        The arrays are filled from batches of rows retrieved from the product catalogue, without creating an object
+        for each product found. Properties of type long, integer, real, and boolean are returned as arrays of type
+        int64, int32, float64, and bool respectively. If any of the values of such a property is undefined, a masked
+        array is returned instead. Timestamps are returned as arrays of type datetime64[us] (undefined timestamps are
+        represented as NaT), and UUIDs as arrays of 16 byte strings (undefined UUIDs are represented as empty
+        strings). All other properties are returned as arrays of objects (undefined values are represented as None).
+
+        Keyword arguments:
+        batch_size  --  Number of products to retrieve from the product catalogue at a time.
+
+        See search() for a description of the other arguments.
+
+        """
+        if numpy is None:
+            raise Error("search_columns() requires numpy")
+
+        description, batches = self._backend.iter_search_rows(where, order_by, limit, parameters, namespaces,
+                                                              property_names, batch_size)
+
+        # Determine the index and type of each column. For namespaces other than the core namespace, the first column
+        # (uuid) only indicates if a product occurs in the namespace and is skipped.
+        columns, index = collections.OrderedDict(), 0
+        for namespace, identifiers in description:
+            schema = self.namespace_schema(namespace)
+            for position, identifier in enumerate(identifiers):
+                if namespace == "core" or position > 0:
+                    columns["%s.%s" % (namespace, identifier)] = (index, schema[identifier])
+                index += 1
+
+        if property_names:
+            names = [name if "." in name else "core." + name for name in property_names]
+            columns = collections.OrderedDict((name, columns[name]) for name in names)
+
+        arrays = dict((name, []) for name in columns)
+        for rows in batches:
+            values = list(zip(*rows))
+            for name, (index, type) in columns.items():
+                arrays[name].append(_column_array(values[index], type))
+
+        return collections.OrderedDict((name, _concatenate_columns(arrays[name], type))
+                                       for name, (_, type) in columns.items())
+
+    def search_page(self, where="", order_by=[], limit=1000, parameters={}, namespaces=[], property_names=[],
+                    after=None, compact=False):
+        """Search the product catalogue for products matching the specified search expression, returning a single
+        page of at most limit products. Returns a tuple of the products found and a continuation token. The token can
+        be passed as the after argument of a subsequent call (with the same search expression and sort order) to
+        retrieve the next page. If there are no more products, the token will be None.
+
+        Pages are determined using keyset pagination: the product uuid is appended to the sort order to obtain a total
+        ordering, and each page starts directly after the sort key values of the last product of the previous page.
+        Contrary to using an offset, retrieving a page therefore does not become slower for pages further down the
+        result set. Properties used in the sort order are always included in the returned products. Products for which
+        an (optional) property used in the sort order is undefined are returned in the position where the database
+        sorts undefined (NULL) values.
+
+        Keyword arguments:
+        limit       --  Maximum number of products per page.
+        after       --  Continuation token returned by a previous call, or None to retrieve the first page.
+
+        See search() for a description of the other arguments.
+
+        """
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise Error("page size %r must be a positive integer" % limit)
+        if limit < 1:
+            raise Error("page size %r must be a positive integer" % limit)
+
+        keyset_order_by = self._backend.keyset_order_by(order_by)
+        keys = [item.lstrip("+-") for item in keyset_order_by]
+
+        # Ensure the properties used in the sort order are included in the returned products.
+        if property_names:
+            property_names = list(property_names)
+            selected = [name if "." in name else "core." + name for name in property_names]
+            property_names.extend([key for key in keys if key not in selected])
+        else:
+            namespaces = list(namespaces)
+            for key in keys:
+                namespace = key.split(".")[0]
+                if namespace != "core" and namespace not in namespaces:
+                    namespaces.append(namespace)
+
+        values = [] if after is None else _decode_page_token(after, keyset_order_by)
+        products = self._backend.search(where, order_by, limit, parameters, namespaces, property_names, values,
+                                        compact=compact)
+        if len(products) < limit:
+            return products, None
+
+        last_product = products[-1]
+        values = [_property_value(last_product, key) for key in keys]
+        return products, _encode_page_token(keyset_order_by, values)
 
     def source_products(self, uuid):
         """Return the UUIDs of the products that are linked to the given product as source products."""
         return self._backend.source_products(uuid)
 
-    def strip(self, where="", parameters={}, force=False):
+    def strip(self, where="", parameters={}, force=False, workers=None):
         """Remove one or more products from disk only (not from the product catalogue). Return the number of products
         stripped.
 
@@ -1246,23 +2184,14 @@ class Archive(object):
         force       --  If set to True, also strip partially ingested products. This affects products for which a
                         failure occured during ingestion, as well as products in the process of being ingested. Use
                         this option with care.
+        workers     --  Number of worker threads used to remove products from disk. By default, the number of CPUs is
+                        used.
         """
         query = "is_defined(archive_path)"
         if where:
             query += " and (" + where + ")"
-        products = self.search(where=query, parameters=parameters,
-                               property_names=['uuid', 'active', 'product_name', 'archive_path', 'physical_name'])
-        for product in products:
-            if not product.core.active and not force:
-                raise Error("product '%s' (%s) not available" % (product.core.product_name, product.core.uuid))
-
-            self._strip(product)
-
-        # Strip (or remove) derived products if necessary.
-        if len(products) > 0:
-            self._establish_invariants()
-
-        return len(products)
+        products = self.search(where=query, parameters=parameters, property_names=_ACCESS_PROPERTY_NAMES)
+        return self._strip_products(products, force, workers)
 
     def strip_by_name(self, product_name):
         """Remove one or more products from disk only (not from the product catalogue).
@@ -1277,7 +2206,8 @@ class Archive(object):
         An exception will be raised if no products with the specified name can be found.
 
         """
-        count = self.strip("product_name == @product_name", {"product_name": product_name})
+        products = self._backend.search_by_name(product_name, property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._strip_products(products)
         if count == 0:
             raise Error("no products found with name '%s'" % product_name)
         return count
@@ -1292,7 +2222,8 @@ class Archive(object):
         An exception will be raised if no product with the specified uuid can be found.
 
         """
-        count = self.strip("uuid == @uuid", {"uuid": uuid})
+        products = self._backend.search_by_uuids([uuid], property_names=_ACCESS_PROPERTY_NAMES)
+        count = self._strip_products(products)
         if count == 0:
             raise Error("product with uuid '%s' not found" % uuid)
         return count
@@ -1369,15 +2300,14 @@ class Archive(object):
                 uuid = properties.core.uuid if uuid is None else uuid
                 if uuid != properties.core.uuid:
                     raise Error("specified uuid does not match uuid included in the specified product properties")
-            existing_product = self.search(where='uuid == @uuid', parameters={'uuid': uuid},
-                                           namespaces=self.namespaces())[0]
+            existing_product = self._backend.search_by_uuids([uuid], namespaces=self.namespaces())[0]
             new_namespaces = list(set(vars(properties).keys()) - set(vars(existing_product).keys()))
         else:
             new_namespaces = None
         self._update_metadata_date(properties)
         self._backend.update_product_properties(properties, uuid=uuid, new_namespaces=new_namespaces)
 
-    def verify_hash(self, where="", parameters={}):
+    def verify_hash(self, where="", parameters={}, full=False):
         """Verify the hash for one or more products in the archive.
         Returns a list of UUIDs of products for which the verification failed.
         This will be an empty list '[]' if all products match their hash.
@@ -1388,17 +2318,10 @@ class Archive(object):
         Keyword arguments:
         where           --  Search expression that determines which products to retrieve.
         parameters      --  Parameters referenced in the search expression (if any).
+        full            --  If set to True, the contents of all files are read, even if the hash cache (see the
+                            use_hash_cache archive option) contains the digest of a file that has not changed since
+                            it was last hashed. The hash cache is updated with the digests computed.
 
         """
-        failed_products = []
-        products = self.search(where=where, parameters=parameters,
-                               property_names=['uuid', 'active', 'product_name', 'archive_path', 'physical_name',
-                                               'hash'])
-        for product in products:
-            if product.core.active and 'archive_path' in product.core:
-                if 'hash' not in product.core:
-                    raise Error("no hash available for product '%s' (%s)" %
-                                (product.core.product_name, product.core.uuid))
-                if self._calculate_hash(product) != product.core.hash:
-                    failed_products.append(product.core.uuid)
-        return failed_products
+        products = self.search(where=where, parameters=parameters, property_names=_VERIFY_PROPERTY_NAMES)
+        return self._verify_hash(products, full)
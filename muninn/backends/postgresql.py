@@ -5,9 +5,15 @@
 from __future__ import absolute_import, division, print_function
 
 from muninn._compat import dictkeys, dictvalues, is_python2_unicode
+from muninn._compat import string_types as basestring
 
+import collections
+import os
 import re
 import functools
+import inspect
+import threading
+import time
 import psycopg2
 import psycopg2.errorcodes
 import psycopg2.extensions
@@ -20,8 +26,10 @@ import muninn.geometry as geometry
 
 from muninn.exceptions import *
 from muninn.function import Prototype
+from muninn.language import BooleanSequence, EmptySequence, LongSequence, RealSequence, TextSequence, \
+    TimestampSequence, UUIDSequence
 from muninn.schema import *
-from muninn.struct import Struct
+from muninn.struct import Row, RowDescription, Struct
 
 
 class _PostgresqlConfig(Mapping):
@@ -29,6 +37,10 @@ class _PostgresqlConfig(Mapping):
 
     connection_string = Text
     table_prefix = optional(Text)
+    use_connection_pool = optional(Boolean)
+    connection_pool_min_size = optional(Integer)
+    connection_pool_max_size = optional(Integer)
+    connection_pool_max_idle_time = optional(Integer)
 
 
 def create(configuration):
@@ -43,31 +55,44 @@ class PostgresqlError(Error):
         super(PostgresqlError, self).__init__(message)
 
 
-def translate_psycopg_errors(func):
-    """Decorator that translates psycopg2 exceptions into muninn exceptions."""
-    @functools.wraps(func)
-    def translate_psycopg_errors_(*args, **kwargs):
+def _translate_psycopg_error(_error):
+    try:
+        message = _error.diag.message_primary
+    except AttributeError:
+        message = None
+
+    if message:
         try:
-            return func(*args, **kwargs)
-        except psycopg2.Error as _error:
-            try:
-                message = _error.diag.message_primary
-            except AttributeError:
-                message = None
+            message_detail = _error.diag.message_detail
+        except AttributeError:
+            message_detail = None
 
-            if message:
-                try:
-                    message_detail = _error.diag.message_detail
-                except AttributeError:
-                    message_detail = None
+        if message_detail:
+            message += " [" + message_detail + "]"
+    else:
+        # Remove newlines and excessive whitespace from the original Postgresql exception message.
+        message = " ".join(str(_error).split())
 
-                if message_detail:
-                    message += " [" + message_detail + "]"
-            else:
-                # Remove newlines and excessive whitespace from the original Postgresql exception message.
-                message = " ".join(str(_error).split())
+    return PostgresqlError(message)
 
-            raise PostgresqlError(message)
+
+def translate_psycopg_errors(func):
+    """Decorator that translates psycopg2 exceptions into muninn exceptions."""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def translate_psycopg_errors_(*args, **kwargs):
+            try:
+                for item in func(*args, **kwargs):
+                    yield item
+            except psycopg2.Error as _error:
+                raise _translate_psycopg_error(_error)
+    else:
+        @functools.wraps(func)
+        def translate_psycopg_errors_(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except psycopg2.Error as _error:
+                raise _translate_psycopg_error(_error)
 
     return translate_psycopg_errors_
 
@@ -99,6 +124,157 @@ def _cast_geography(hexewkb, cursor):
     return ewkb.decode_hexewkb(hexewkb)
 
 
+def _get_db_type_id(connection, typename):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT NULL::%s" % typename.lower())
+            if not cursor.description:
+                raise InternalError("unable to retrieve type object id of database type: \"%s\"" % typename.upper())
+            type_id = cursor.description[0][1]
+        finally:
+            cursor.close()
+    except:
+        connection.rollback()
+        raise
+    else:
+        connection.commit()
+
+    return type_id
+
+
+def _connect(connection_string):
+    """Establish a new connection to the database and register the required adapters and casts on it."""
+    connection = psycopg2.connect(connection_string)
+
+    # Register adapter and cast for the UUID type.
+    psycopg2.extras.register_uuid(conn_or_curs=connection)
+
+    # Register adapter for the Geometry type.
+    psycopg2.extensions.register_adapter(geometry.Geometry, _adapt_geometry)
+
+    # Register cast for the Geometry type.
+    geography_oid = _get_db_type_id(connection, "geography")
+    geography_type = psycopg2.extensions.new_type((geography_oid,), "GEOGRAPHY", _cast_geography)
+    psycopg2.extensions.register_type(geography_type, connection)
+
+    return connection
+
+
+class ConnectionPool(object):
+    """Process local pool of database connections that share the same connection string.
+
+    Connections are handed out for the duration of a single transaction, such that connections (and the adapters and
+    casts registered on them) are reused across transactions and across archive instances. At most max_size
+    connections (0 means no limit) will be open at the same time; acquire() blocks until a connection becomes
+    available if this limit is reached. Idle connections are closed after max_idle_time seconds (0 means never), but
+    at least min_size idle connections are kept open.
+
+    The pool detects if it is used from a different process than the one that created it (e.g. after a fork by the
+    multiprocessing module). Connections inherited from the parent process are abandoned in that case, without
+    closing them, because closing them would also affect the parent process.
+
+    """
+    def __init__(self, connection_string, min_size=1, max_size=0, max_idle_time=0):
+        self._connection_string = connection_string
+        self._min_size = min_size
+        self._max_size = max_size
+        self._max_idle_time = max_idle_time
+
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._abandoned = []
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            self._abandoned.extend([connection for connection, _ in self._idle])
+            self._pid = os.getpid()
+            self._idle = []
+            self._size = 0
+
+    def _close(self, connection):
+        self._size -= 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _expire(self):
+        if self._max_idle_time <= 0:
+            return
+
+        # Idle connections are ordered from least to most recently used.
+        now = time.time()
+        while self._idle and self._size > self._min_size and now - self._idle[0][1] > self._max_idle_time:
+            connection, _ = self._idle.pop(0)
+            self._close(connection)
+
+    def acquire(self):
+        with self._condition:
+            self._check_process()
+            self._expire()
+
+            while True:
+                if self._idle:
+                    connection, _ = self._idle.pop()
+                    if not connection.closed:
+                        return connection
+                    self._size -= 1
+                elif self._max_size <= 0 or self._size < self._max_size:
+                    self._size += 1
+                    break
+                else:
+                    self._condition.wait()
+
+        try:
+            return _connect(self._connection_string)
+        except:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection):
+        with self._condition:
+            if self._pid != os.getpid():
+                # Connection belongs to a different process.
+                self._abandoned.append(connection)
+                return
+
+            if not connection.closed and \
+                    connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    pass
+
+            if connection.closed or \
+                    connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                self._close(connection)
+            else:
+                self._idle.append((connection, time.time()))
+
+            self._expire()
+            self._condition.notify()
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def connection_pool(connection_string, min_size=1, max_size=0, max_idle_time=0):
+    """Return the (shared) connection pool for the specified connection string and pool settings."""
+    key = (connection_string, min_size, max_size, max_idle_time)
+    with _connection_pools_lock:
+        try:
+            return _connection_pools[key]
+        except KeyError:
+            pool = _connection_pools[key] = ConnectionPool(connection_string, min_size, max_size, max_idle_time)
+            return pool
+
+
 class PostgresqlConnection(object):
     """Wrapper for a psycopg2 database connection that defers (re)connection until an attempt is made to use the
     connection.
@@ -106,11 +282,15 @@ class PostgresqlConnection(object):
     Only non-nested transactions are supported, no auto-commit or nested transactions. A transaction can be started
     using the context manager interface.
 
+    If a connection pool is specified, a connection is acquired from the pool at the start of each transaction and it
+    is returned to the pool at the end of the transaction, instead of opening and closing a connection.
+
     """
-    def __init__(self, connection_string):
+    def __init__(self, connection_string, pool=None):
         self._connection_string = connection_string
         self._connection = None
         self._in_transaction = False
+        self._pool = pool
 
     def __enter__(self):
         # Begin a transaction. The transaction is not started immediately, but a state change is recorded such that
@@ -142,40 +322,17 @@ class PostgresqlConnection(object):
 
     def _connect(self):
         # Re-establish the connection to the database.
-        self._connection = psycopg2.connect(self._connection_string)
-
-        # Register adapter and cast for the UUID type.
-        psycopg2.extras.register_uuid(conn_or_curs=self._connection)
-
-        # Register adapter for the Geometry type.
-        psycopg2.extensions.register_adapter(geometry.Geometry, _adapt_geometry)
-
-        # Register cast for the Geometry type.
-        geography_oid = self._get_db_type_id("geography")
-        geography_type = psycopg2.extensions.new_type((geography_oid,), "GEOGRAPHY", _cast_geography)
-        psycopg2.extensions.register_type(geography_type, self._connection)
+        if self._pool is not None:
+            self._connection = self._pool.acquire()
+        else:
+            self._connection = _connect(self._connection_string)
 
     def _disconnect(self):
-        self._connection.close()
-        self._connection = None
-
-    def _get_db_type_id(self, typename):
-        try:
-            cursor = self._connection.cursor()
-            try:
-                cursor.execute("SELECT NULL::%s" % typename.lower())
-                if not cursor.description:
-                    raise InternalError("unable to retrieve type object id of database type: \"%s\"" % typename.upper())
-                type_id = cursor.description[0][1]
-            finally:
-                cursor.close()
-        except:
-            self._connection.rollback()
-            raise
+        if self._pool is not None:
+            self._pool.release(self._connection)
         else:
-            self._connection.commit()
-
-        return type_id
+            self._connection.close()
+        self._connection = None
 
     def close(self):
         if self._in_transaction:
@@ -185,11 +342,11 @@ class PostgresqlConnection(object):
         if self._connection is not None:
             self._disconnect()
 
-    def cursor(self):
+    def cursor(self, name=None):
         if not self._in_transaction:
             raise InternalError("creating a cursor requires an active transaction")
 
-        return self._connection.cursor()
+        return self._connection.cursor(name)
 
     @property
     def encoding(self):
@@ -197,8 +354,13 @@ class PostgresqlConnection(object):
 
 
 class PostgresqlBackend(object):
-    def __init__(self, connection_string="", table_prefix=""):
-        self._connection = PostgresqlConnection(connection_string)
+    def __init__(self, connection_string="", table_prefix="", use_connection_pool=False, connection_pool_min_size=1,
+                 connection_pool_max_size=0, connection_pool_max_idle_time=0):
+        pool = None
+        if use_connection_pool:
+            pool = connection_pool(connection_string, connection_pool_min_size, connection_pool_max_size,
+                                   connection_pool_max_idle_time)
+        self._connection = PostgresqlConnection(connection_string, pool)
 
         if table_prefix and not re.match(r"[a-z][_a-z]*(\.[a-z][_a-z]*)*", table_prefix):
             raise ValueError("invalid table_prefix %s" % table_prefix)
@@ -210,7 +372,25 @@ class PostgresqlBackend(object):
 
         self._namespace_schemas = {}
         self._sql_builder = sql.SQLBuilder({}, sql.TypeMap(), {}, self._table_name, self._placeholder,
-                                           self._placeholder, self._rewriter_property)
+                                           self._placeholder, self._rewriter_property,
+                                           nulls_sort_low=False)
+
+    def _create_index_sql(self, namespace, names):
+        schema = self._namespace_schema(namespace)
+        if not names:
+            raise Error("no properties specified for index on namespace: %r" % namespace)
+        for name in names:
+            if name not in schema:
+                raise Error("no property: %r defined within namespace: %r" % (name, namespace))
+
+        table_name = self._table_name(namespace)
+        index_name = "idx_%s_%s" % (table_name, "_".join(names))
+        if any(self._type_map()[schema[name]] == "GEOGRAPHY" for name in names):
+            if len(names) != 1:
+                raise Error("geometry properties cannot be part of a multi-column index: %s" %
+                            ", ".join(namespace + "." + name for name in names))
+            return index_name, "CREATE INDEX %s ON %s USING GIST (%s)" % (index_name, table_name, names[0])
+        return index_name, "CREATE INDEX %s ON %s (%s)" % (index_name, table_name, ", ".join(names))
 
     def _create_tables_sql(self):
         result = []
@@ -241,6 +421,7 @@ class PostgresqlBackend(object):
             result.append("ALTER TABLE %s ADD CONSTRAINT %s_uuid_fkey FOREIGN KEY (uuid) REFERENCES %s (uuid) ON "
                           "DELETE CASCADE" % (self._table_name(namespace), self._table_name(namespace),
                                               self._core_table_name))
+            result.extend(sql for _, sql in self._namespace_indexes(namespace))
 
         # We use explicit 'id' primary keys for the links and tags tables so the entries can be managed using
         # other front-ends that may not support tuples as primary keys.
@@ -280,6 +461,23 @@ class PostgresqlBackend(object):
         finally:
             cursor.close()
 
+    def _delete_product_properties_many(self, uuids):
+        uuids = list(set(uuids))
+        if not uuids:
+            return
+
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute("DELETE FROM %s WHERE source_uuid = ANY(%s)" % (self._link_table_name, self._placeholder()),
+                           (uuids,))
+            cursor.execute("DELETE FROM %s WHERE uuid = ANY(%s)" % (self._core_table_name, self._placeholder()),
+                           (uuids,))
+
+            if cursor.rowcount != len(uuids):
+                raise Error("could not delete properties for %d product(s)" % (len(uuids) - cursor.rowcount))
+        finally:
+            cursor.close()
+
     def _derived_products(self, uuid):
         query = "SELECT uuid FROM %s WHERE source_uuid = %s" % (self._link_table_name, self._placeholder())
         parameters = (uuid,)
@@ -314,30 +512,67 @@ class PostgresqlBackend(object):
         finally:
             cursor.close()
 
-    def _find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta()):
-        core_properties = list(self._namespace_schema("core"))
-        select_list = ["%s.%s" % (self._core_table_name, name) for name in core_properties]
+    def _find_derived_products(self, uuids):
+        uuids = list(uuids)
+        if not uuids:
+            return []
 
-        query = "SELECT %s FROM %s WHERE active AND now() AT TIME ZONE 'UTC' - archive_date > %s AND uuid IN (SELECT " \
-                "uuid FROM %s EXCEPT SELECT DISTINCT link.uuid FROM %s AS link LEFT JOIN %s AS source ON " \
-                "(link.source_uuid = source.uuid) WHERE source.uuid IS NULL OR source.archive_path IS NOT NULL)" % \
-                (", ".join(select_list), self._core_table_name, self._placeholder(), self._link_table_name,
-                 self._link_table_name, self._core_table_name)
-
-        if product_type is not None:
-            query = "%s AND product_type = %s" % (query, self._placeholder())
+        # Walk the link table starting from the specified products. Using UNION (instead of UNION ALL) ensures each
+        # product is visited only once, even if the links contain cycles.
+        query = "WITH RECURSIVE derived(uuid) AS (SELECT uuid FROM %s WHERE source_uuid = ANY(%s) UNION SELECT " \
+                "link.uuid FROM %s AS link JOIN derived ON (link.source_uuid = derived.uuid)) SELECT uuid FROM %s " \
+                "WHERE uuid IN (SELECT uuid FROM derived)" % (self._link_table_name, self._placeholder(),
+                                                              self._link_table_name, self._core_table_name)
 
         cursor = self._connection.cursor()
         try:
-            cursor.execute(query, (grace_period,) if product_type is None else (grace_period, product_type))
+            cursor.execute(query, (uuids,))
+            return [row[0] for row in cursor]
+        finally:
+            cursor.close()
+
+    def _find_products(self, query, parameters, uuids=None):
+        # Execute a query that selects the core properties of products. If uuids is not None, only the specified
+        # products are considered.
+        core_properties = list(self._namespace_schema("core"))
+        description = [("core", core_properties)]
 
-            description = [("core", core_properties)]
+        if uuids is not None:
+            uuids = list(uuids)
+            if not uuids:
+                return []
+            query = "%s AND %s.uuid = ANY(%s)" % (query, self._core_table_name, self._placeholder())
+            parameters = tuple(parameters) + (uuids,)
+
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute(query, parameters)
             return [self._unpack_product_properties(description, row) for row in cursor]
         finally:
             cursor.close()
 
+    def _find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta(),
+                                                uuids=None):
+        core_properties = list(self._namespace_schema("core"))
+        select_list = ["%s.%s" % (self._core_table_name, name) for name in core_properties]
+
+        # Select products that have at least one link, none of which refers to a source product that is either
+        # available or not present in the catalogue.
+        query = "SELECT %s FROM %s WHERE active AND now() AT TIME ZONE 'UTC' - archive_date > %s AND EXISTS (SELECT " \
+                "1 FROM %s AS link WHERE link.uuid = %s.uuid) AND NOT EXISTS (SELECT 1 FROM %s AS link LEFT JOIN %s " \
+                "AS source ON (link.source_uuid = source.uuid) WHERE link.uuid = %s.uuid AND (source.uuid IS NULL OR " \
+                "source.archive_path IS NOT NULL))" % \
+                (", ".join(select_list), self._core_table_name, self._placeholder(), self._link_table_name,
+                 self._core_table_name, self._link_table_name, self._core_table_name, self._core_table_name)
+
+        if product_type is not None:
+            query = "%s AND product_type = %s" % (query, self._placeholder())
+
+        return self._find_products(query, (grace_period,) if product_type is None else (grace_period, product_type),
+                                   uuids)
+
     def _find_products_without_source(self, product_type=None, grace_period=datetime.timedelta(),
-                                      archived_only=False):
+                                      archived_only=False, uuids=None):
         core_properties = list(self._namespace_schema("core"))
         select_list = ["%s.%s" % (self._core_table_name, name) for name in core_properties]
         query = "SELECT %s FROM %s WHERE %s.active AND now() AT TIME ZONE 'UTC' - %s.archive_date > %s AND NOT " \
@@ -353,12 +588,16 @@ class PostgresqlBackend(object):
         if archived_only:
             query = "%s AND archive_path IS NOT NULL" % query
 
+        return self._find_products(query, (grace_period,) if product_type is None else (grace_period, product_type),
+                                   uuids)
+
+    def _index_exists(self, index_name):
+        # PostgreSQL folds unquoted identifiers to lower case and truncates them to 63 characters.
+        query = "SELECT relname FROM pg_class WHERE relname=%s" % (self._placeholder(),)
         cursor = self._connection.cursor()
         try:
-            cursor.execute(query, (grace_period,) if product_type is None else (grace_period, product_type))
-
-            description = [("core", core_properties)]
-            return [self._unpack_product_properties(description, row) for row in cursor]
+            cursor.execute(query, (index_name[:63].lower(),))
+            return len(cursor.fetchall()) != 0
         finally:
             cursor.close()
 
@@ -387,6 +626,37 @@ class PostgresqlBackend(object):
         finally:
             cursor.close()
 
+    def _insert_namespace_properties_many(self, name, properties_list):
+        # Group the properties by the set of fields they define, such that all properties in a group can be inserted
+        # using a single (batched) INSERT query.
+        groups = collections.OrderedDict()
+        for uuid, properties in properties_list:
+            self._validate_namespace_properties(name, properties)
+            assert uuid is not None and getattr(properties, "uuid", uuid) == uuid
+
+            properties_dict = vars(properties)
+            fields = sorted(properties_dict)
+            parameters = [properties_dict[field] for field in fields]
+            if "uuid" not in properties_dict:
+                fields.append("uuid")
+                parameters.append(uuid)
+
+            groups.setdefault(tuple(fields), []).append(parameters)
+
+        cursor = self._connection.cursor()
+        try:
+            for fields, parameters_list in groups.items():
+                if hasattr(psycopg2.extras, "execute_values"):
+                    query = "INSERT INTO %s (%s) VALUES %%s" % (self._table_name(name), ", ".join(fields))
+                    psycopg2.extras.execute_values(cursor, query, parameters_list)
+                else:
+                    # execute_values() is only available as of psycopg2 2.7.
+                    query = "INSERT INTO %s (%s) VALUES (%s)" % (self._table_name(name), ", ".join(fields),
+                                                                ", ".join([self._placeholder()] * len(fields)))
+                    cursor.executemany(query, parameters_list)
+        finally:
+            cursor.close()
+
     def _link(self, uuid, source_uuids):
         query = "INSERT INTO %s (uuid, source_uuid) SELECT %s, %s" % (self._link_table_name, self._placeholder(),
                                                                       self._placeholder())
@@ -407,6 +677,15 @@ class PostgresqlBackend(object):
                 finally:
                     cursor.close()
 
+    def _namespace_indexes(self, namespace):
+        # Namespaces declare indexes using an '_indexes' attribute: a list of property names and / or tuples of
+        # property names (for multi-column indexes).
+        result = []
+        for index in getattr(self._namespace_schema(namespace), "_indexes", []):
+            names = (index,) if isinstance(index, basestring) else tuple(index)
+            result.append(self._create_index_sql(namespace, names))
+        return result
+
     def _namespace_schema(self, namespace):
         try:
             return self._namespace_schemas[namespace]
@@ -416,6 +695,13 @@ class PostgresqlBackend(object):
     def _placeholder(self, name=""):
         return "%s" if not name else "%%(%s)s" % name
 
+    def _product_unpacker(self, description, compact=False):
+        # Compact rows share a single description and wrap the row as returned by the database. Contrary to Struct
+        # based results, they are not validated against the namespace schemas.
+        if compact:
+            return functools.partial(Row, RowDescription(description, self._namespace_schema))
+        return functools.partial(self._unpack_product_properties, description)
+
     def _rewriter_property(self, column_name, subscript):
         # timestamp
         if subscript == 'year':
@@ -440,6 +726,28 @@ class PostgresqlBackend(object):
         rewriter_table[Prototype("-", (Timestamp, Timestamp), Real)] = \
             lambda arg0, arg1: "EXTRACT(EPOCH FROM (%s) - (%s))" % (arg0, arg1)
 
+        #
+        # Set membership operator. The sequence of values is bound as a single (array) parameter.
+        #
+        in_rewriter = lambda arg0, arg1: "(%s = ANY(%s))" % (arg0, arg1)
+        rewriter_table[Prototype("in", (Long, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Long, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Boolean, BooleanSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Text, TextSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Timestamp, TimestampSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (UUID, UUIDSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Long, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Boolean, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Text, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Timestamp, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (UUID, EmptySequence), Boolean)] = in_rewriter
+
         #
         # Functions.
         #
@@ -650,11 +958,28 @@ class PostgresqlBackend(object):
             finally:
                 cursor.close()
 
+    @translate_psycopg_errors
+    def create_index(self, namespace, names, dry_run=False):
+        index_name, sql = self._create_index_sql(namespace, tuple(names))
+        with self._connection:
+            if self._index_exists(index_name):
+                return []
+            if not dry_run:
+                self._execute_list([sql])
+        return [sql]
+
     @translate_psycopg_errors
     def delete_product_properties(self, uuid):
         with self._connection:
             self._delete_product_properties(uuid)
 
+    @translate_psycopg_errors
+    def delete_product_properties_many(self, uuids):
+        """Delete the properties of multiple products (and the links to these products) using a single transaction.
+        Either all products are deleted, or none of them are."""
+        with self._connection:
+            self._delete_product_properties_many(uuids)
+
     @translate_psycopg_errors
     def derived_products(self, uuid):
         with self._connection:
@@ -670,6 +995,50 @@ class PostgresqlBackend(object):
         automatically when required."""
         self._connection.close()
 
+    @translate_psycopg_errors
+    def explain(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                analyze=False, unpack=False):
+        """Return the SQL query that corresponds to a search, the parameters bound to the query, the query plan, and
+        the time spent (in seconds) on each step of the search. If analyze is True, the query is executed using EXPLAIN
+        ANALYZE, and the execution time reported by the database is included. If unpack is True as well, the query is
+        executed a second time to include the time spent unpacking the results."""
+        timings = collections.OrderedDict([("parse", 0.0), ("analyze", 0.0)])
+        start = time.time()
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 timings=timings)
+        timings["build"] = time.time() - start - timings["parse"] - timings["analyze"]
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                explain = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+                cursor.execute(explain + query, query_parameters)
+                plan = [row[0] for row in cursor]
+
+                if analyze:
+                    # Use the execution time as measured by the database while analyzing the query ("Total runtime"
+                    # for PostgreSQL versions before 9.4).
+                    for line in plan:
+                        match = re.match(r"\s*(?:Execution Time|Total runtime):\s*([0-9.]+)\s*ms", line)
+                        if match is not None:
+                            timings["execute"] = float(match.group(1)) / 1000.0
+
+                if analyze and unpack:
+                    cursor.execute(query, query_parameters)
+                    rows = cursor.fetchall()
+
+                    start = time.time()
+                    for row in rows:
+                        self._unpack_product_properties(query_description, row)
+                    timings["unpack"] = time.time() - start
+            finally:
+                cursor.close()
+
+        result = Struct()
+        result.query, result.parameters, result.plan, result.timings = query, query_parameters, plan, timings
+        return result
+
     @translate_psycopg_errors
     def exists(self):
         with self._connection:
@@ -683,7 +1052,17 @@ class PostgresqlBackend(object):
                 cursor.close()
 
     @translate_psycopg_errors
-    def find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta()):
+    def find_derived_products(self, uuids):
+        """Return the uuids of all products that are derived, directly or indirectly, from one or more of the specified
+           products.
+
+        """
+        with self._connection:
+            return self._find_derived_products(uuids)
+
+    @translate_psycopg_errors
+    def find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta(),
+                                               uuids=None):
         """Return the core properties of all products that are linked to one or more source products, all of which are
            unavailable. A product is unavailable if there is no data associated with it, only properties. Products that
            have links to external source products will not be selected by this function, because it cannot be
@@ -691,28 +1070,30 @@ class PostgresqlBackend(object):
 
            Keyword arguments:
            product_type --  Only consider products of the specified product type.
+           uuids        --  Only consider the products with the specified uuids.
 
         """
         with self._connection:
-            return self._find_products_without_available_source(product_type, grace_period)
+            return self._find_products_without_available_source(product_type, grace_period, uuids)
 
     @translate_psycopg_errors
     def find_products_without_source(self, product_type=None, grace_period=datetime.timedelta(),
-                                     archived_only=False):
+                                     archived_only=False, uuids=None):
         """Return the core properties of all products that are not linked to any source products.
 
            Keyword arguments:
            product_type --  Only consider products of the specified product type.
+           uuids        --  Only consider the products with the specified uuids.
 
         """
         with self._connection:
-            return self._find_products_without_source(product_type, grace_period, archived_only)
+            return self._find_products_without_source(product_type, grace_period, archived_only, uuids)
 
     def initialize(self, namespace_schemas):
         self._namespace_schemas = namespace_schemas
         self._sql_builder = sql.SQLBuilder(self._namespace_schemas, self._type_map(), self._rewriter_table(),
                                            self._table_name, self._placeholder, self._placeholder,
-                                           self._rewriter_property)
+                                           self._rewriter_property, nulls_sort_low=False)
 
     @translate_psycopg_errors
     def insert_product_properties(self, properties):
@@ -723,6 +1104,68 @@ class PostgresqlBackend(object):
                     continue
                 self._insert_namespace_properties(properties.core.uuid, ns_name, ns_properties)
 
+    @translate_psycopg_errors
+    def insert_product_properties_many(self, properties_list):
+        """Insert the properties of multiple products using a single transaction. Either all products are inserted, or
+        none of them are."""
+        namespaces = collections.OrderedDict([("core", [])])
+        for properties in properties_list:
+            for ns_name, ns_properties in vars(properties).items():
+                namespaces.setdefault(ns_name, []).append((properties.core.uuid, ns_properties))
+
+        with self._connection:
+            for ns_name, ns_properties_list in namespaces.items():
+                if ns_properties_list:
+                    self._insert_namespace_properties_many(ns_name, ns_properties_list)
+
+    @translate_psycopg_errors
+    def iter_search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                    batch_size=1000, after=None, compact=False):
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 after)
+        unpack = self._product_unpacker(query_description, compact)
+
+        with self._connection:
+            # Use a named (server side) cursor, such that results are transferred from the database server in batches.
+            cursor = self._connection.cursor("muninn_iter_search")
+            cursor.itersize = batch_size
+            try:
+                cursor.execute(query, query_parameters)
+                for row in cursor:
+                    yield unpack(row)
+            finally:
+                cursor.close()
+
+    @translate_psycopg_errors
+    def iter_search_rows(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                         batch_size=1000):
+        """Return the description of the search result, and an iterator over batches of rows as returned by the
+        database. The description is a list of (namespace, identifiers) tuples. For all namespaces other than "core",
+        the first identifier is "uuid", which is None if the product does not occur in the namespace."""
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names)
+
+        @translate_psycopg_errors
+        def batches():
+            with self._connection:
+                # Use a named (server side) cursor, such that rows are transferred from the database in batches.
+                cursor = self._connection.cursor("muninn_iter_search_rows")
+                try:
+                    cursor.execute(query, query_parameters)
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    cursor.close()
+
+        return query_description, batches()
+
+    def keyset_order_by(self, order_by):
+        return self._sql_builder.keyset_order_by(order_by)
+
     @translate_psycopg_errors
     def link(self, uuid, source_uuids):
         self._link(uuid, source_uuids)
@@ -736,9 +1179,49 @@ class PostgresqlBackend(object):
         return sqls
 
     @translate_psycopg_errors
-    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[]):
+    def prepare_indexes(self, dry_run=False):
+        sqls = []
+        with self._connection:
+            for namespace in self._namespace_schemas:
+                for index_name, sql in self._namespace_indexes(namespace):
+                    if not self._index_exists(index_name):
+                        sqls.append(sql)
+            if not dry_run:
+                self._execute_list(sqls)
+        return sqls
+
+    def query_cache_info(self):
+        """Return the number of hits and misses, the maximum size, and the current size of the cache of compiled search
+        expressions."""
+        return self._sql_builder.cache_info()
+
+    @translate_psycopg_errors
+    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+               after=None, compact=False):
         query, query_parameters, query_description = \
-            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names)
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 after)
+        unpack = self._product_unpacker(query_description, compact)
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute(query, query_parameters)
+                return [unpack(row) for row in cursor]
+            finally:
+                cursor.close()
+
+    @translate_psycopg_errors
+    def search_by_name(self, product_name, product_type=None, namespaces=[], property_names=[]):
+        """Return the properties of the products with the specified name (and product type, if specified). The lookup
+        is performed directly on the (product_type, product_name) key, without parsing a search expression."""
+        query, _, query_description = self._sql_builder.build_search_query(namespaces=namespaces,
+                                                                          property_names=property_names)
+        query = "%s WHERE %s.product_name = %s" % (query, self._core_table_name, self._placeholder())
+        query_parameters = [product_name]
+        if product_type is not None:
+            query = "%s AND %s.product_type = %s" % (query, self._core_table_name, self._placeholder())
+            query_parameters.append(product_type)
 
         with self._connection:
             cursor = self._connection.cursor()
@@ -748,6 +1231,26 @@ class PostgresqlBackend(object):
             finally:
                 cursor.close()
 
+    @translate_psycopg_errors
+    def search_by_uuids(self, uuids, namespaces=[], property_names=[]):
+        """Return the properties of the products with the specified uuids (in no particular order). Products that do
+        not exist are ignored."""
+        uuids = list(uuids)
+        if not uuids:
+            return []
+
+        query, _, query_description = self._sql_builder.build_search_query(namespaces=namespaces,
+                                                                          property_names=property_names)
+        query = "%s WHERE %s.uuid = ANY(%s)" % (query, self._core_table_name, self._placeholder())
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute(query, (uuids,))
+                return [self._unpack_product_properties(query_description, row) for row in cursor]
+            finally:
+                cursor.close()
+
     @translate_psycopg_errors
     def server_time_utc(self):
         with self._connection:
@@ -781,6 +1284,26 @@ class PostgresqlBackend(object):
     def tag(self, uuid, tags):
         self._tag(uuid, tags)
 
+    @translate_psycopg_errors
+    def tag_many(self, uuid_tags):
+        """Set tags on multiple products using a single transaction. The tags should be specified as a sequence of
+        (uuid, tags) pairs."""
+        query = "INSERT INTO %s (uuid, tag) SELECT %s, %s" % (self._tag_table_name, self._placeholder(),
+                                                              self._placeholder())
+        query += " WHERE NOT EXISTS (SELECT 1 FROM %s WHERE uuid=%s and tag=%s)" % (self._tag_table_name,
+                                                                                    self._placeholder(),
+                                                                                    self._placeholder())
+        parameters_list = [(uuid, tag, uuid, tag) for uuid, tags in uuid_tags for tag in tags]
+        if not parameters_list:
+            return
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.executemany(query, parameters_list)
+            finally:
+                cursor.close()
+
     @translate_psycopg_errors
     def tags(self, uuid):
         with self._connection:
@@ -818,3 +1341,16 @@ class PostgresqlBackend(object):
                     self._insert_namespace_properties(uuid, ns_name, ns_properties)
                 else:
                     self._update_namespace_properties(uuid, ns_name, ns_properties)
+
+    @translate_psycopg_errors
+    def update_product_properties_many(self, properties_list):
+        """Update the properties of multiple products using a single transaction. The properties of each product should
+        include the core.uuid property. Either all products are updated, or none of them are."""
+        for properties in properties_list:
+            if "core" not in properties or "uuid" not in properties.core:
+                raise Error("no uuid included in the specified product properties")
+
+        with self._connection:
+            for properties in properties_list:
+                for ns_name, ns_properties in vars(properties).items():
+                    self._update_namespace_properties(properties.core.uuid, ns_name, ns_properties)
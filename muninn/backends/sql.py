@@ -7,10 +7,12 @@ from __future__ import absolute_import, division, print_function
 import collections
 import inspect
 import re
+import threading
+import time
 
 from muninn.exceptions import *
 from muninn.function import Prototype
-from muninn.language import parse_and_analyze
+from muninn.language import analyze, parse, _literal_type
 from muninn.schema import *
 from muninn.visitor import Visitor
 
@@ -38,6 +40,65 @@ GROUP_BY_FUNCTIONS = collections.OrderedDict([
 ])
 
 
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _LRUCache(object):
+    """Thread-safe cache that holds a limited number of items, discarding the least recently used item first."""
+
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self._misses += 1
+                return None
+
+            self._items[key] = value
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        if self._maxsize <= 0:
+            return
+
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._hits = self._misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._maxsize, len(self._items))
+
+
+def _parameter_types(parameters):
+    # Return a (hashable) description of the types of the specified parameters. The type of a parameter determines
+    # which functions and operators are selected during semantic analysis, and thereby the SQL that is generated. The
+    # type of parameters of unsupported types is not determined here; an error will be raised during semantic analysis
+    # if such a parameter is referenced.
+    types = []
+    for name, value in (parameters or {}).items():
+        try:
+            type = _literal_type(value)
+        except Error:
+            type = None
+        types.append((name, type))
+    return tuple(sorted(types, key=lambda item: item[0]))
+
+
 class TypeMap(collections.MutableMapping):
     def __init__(self):
         self._types = {}
@@ -276,12 +337,15 @@ class _WhereExpressionVisitor(Visitor):
         self._named_placeholder = named_placeholder_func
 
     def visit(self, visitable):
-        self._count, self._parameters, self._namespaces = 0, {}, set()
-        return super(_WhereExpressionVisitor, self).visit(visitable), self._parameters, self._namespaces
+        # Return the SQL expression, the values of the literals (by placeholder name), the names of the parameters
+        # referred to (by placeholder name), and the namespaces referred to.
+        self._count, self._literals, self._references, self._namespaces = 0, {}, {}, set()
+        expr = super(_WhereExpressionVisitor, self).visit(visitable)
+        return expr, self._literals, self._references, self._namespaces
 
     def visit_Literal(self, visitable):
         parameter_name = str(self._count)
-        self._parameters[parameter_name] = visitable.value
+        self._literals[parameter_name] = visitable.value
         self._count += 1
         return self._named_placeholder(parameter_name)
 
@@ -292,7 +356,7 @@ class _WhereExpressionVisitor(Visitor):
 
     def visit_ParameterReference(self, visitable):
         parameter_name = str(self._count)
-        self._parameters[parameter_name] = visitable.value
+        self._references[parameter_name] = visitable.name
         self._count += 1
         return self._named_placeholder(parameter_name)
 
@@ -352,7 +416,7 @@ class Identifier(object):
 
 class SQLBuilder(object):
     def __init__(self, namespace_schemas, type_map, rewriter_table, table_name_func, _named_placeholder_func,
-                 _placeholder_func, rewriter_property_func):
+                 _placeholder_func, rewriter_property_func, query_cache_size=256, nulls_sort_low=True):
         self._namespace_schemas = namespace_schemas
         self._type_map = type_map
         self._rewriter_table = rewriter_table
@@ -360,6 +424,10 @@ class SQLBuilder(object):
         self._named_placeholder = _named_placeholder_func
         self._placeholder = _placeholder_func
         self._rewriter_property = rewriter_property_func
+        self._query_cache = _LRUCache(query_cache_size)
+        # True if the database sorts NULL values before any other value in ascending order (and after any other value
+        # in descending order).
+        self._nulls_sort_low = nulls_sort_low
 
     def build_create_table_query(self, namespace):
         column_sql = []
@@ -384,9 +452,7 @@ class SQLBuilder(object):
         # Parse the where clause.
         where_clause, where_parameters = "", {}
         if where:
-            ast = parse_and_analyze(where, self._namespace_schemas, parameters)
-            visitor = _WhereExpressionVisitor(self._rewriter_table, self._column_name, self._named_placeholder)
-            where_expr, where_parameters, where_namespaces = visitor.visit(ast)
+            where_expr, where_parameters, where_namespaces = self._compile_where(where, parameters)
             if where_expr:
                 inner_join_set.update(where_namespaces)
                 where_clause = "WHERE %s" % where_expr
@@ -425,9 +491,7 @@ class SQLBuilder(object):
         # Parse the WHERE clause.
         where_clause, where_parameters = '', {}
         if where:
-            ast = parse_and_analyze(where, self._namespace_schemas, parameters)
-            visitor = _WhereExpressionVisitor(self._rewriter_table, self._column_name, self._named_placeholder)
-            where_expr, where_parameters, where_namespaces = visitor.visit(ast)
+            where_expr, where_parameters, where_namespaces = self._compile_where(where, parameters)
             if where_expr:
                 inner_join_set.update(where_namespaces)
                 where_clause = 'WHERE %s' % where_expr
@@ -524,7 +588,8 @@ class SQLBuilder(object):
 
         return query, where_parameters, result_fields
 
-    def build_search_query(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[]):
+    def build_search_query(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                           after=None, timings=None):
         # Namespaces are combined via (left) outer joins, with the core namespace as the leftmost namespace. This
         # ensures that properties will be returned of any product that occurs in zero or more of the requested
         # namespaces.
@@ -534,6 +599,15 @@ class SQLBuilder(object):
         # considered by the "where" and "order by" expressions. This also means that products that do not occur in all
         # of the namespaces referred to in the "where" and "order by" expressions will be ignored.
         #
+        # If after is not None, keyset pagination is used. The product uuid is appended to the sort order (if not
+        # already present) to obtain a total ordering, and "after" should contain the values of the sort keys of the
+        # last product of the previous page, or should be empty for the first page.
+        #
+        # If timings is not None, the time spent parsing and analyzing the search expression is stored in timings
+        # (see _compile_where()).
+        #
+        if after is not None:
+            order_by = self.keyset_order_by(order_by)
 
         if property_names:
             namespaces = []
@@ -559,9 +633,7 @@ class SQLBuilder(object):
         # Parse the where clause.
         where_clause, where_parameters = "", {}
         if where:
-            ast = parse_and_analyze(where, self._namespace_schemas, parameters)
-            visitor = _WhereExpressionVisitor(self._rewriter_table, self._column_name, self._named_placeholder)
-            where_expr, where_parameters, where_namespaces = visitor.visit(ast)
+            where_expr, where_parameters, where_namespaces = self._compile_where(where, parameters, timings)
             if where_expr:
                 inner_join_set.update(where_namespaces)
                 where_clause = "WHERE %s" % where_expr
@@ -574,6 +646,15 @@ class SQLBuilder(object):
                 inner_join_set.update(order_by_namespaces)
                 order_by_clause = "ORDER BY %s" % ", ".join(order_by_list)
 
+        # Generate the keyset pagination condition.
+        if after:
+            keyset_expr, keyset_parameters = self._build_keyset_condition(order_by, after)
+            where_parameters.update(keyset_parameters)
+            if where_clause:
+                where_clause = "WHERE (%s) AND (%s)" % (where_clause[len("WHERE "):], keyset_expr)
+            else:
+                where_clause = "WHERE %s" % keyset_expr
+
         # Parse the limit clause.
         limit_clause = ""
         if limit is not None:
@@ -614,6 +695,70 @@ class SQLBuilder(object):
 
         return query, where_parameters, description
 
+    def cache_info(self):
+        """Return the number of hits and misses, the maximum size, and the current size of the query cache."""
+        return self._query_cache.info()
+
+    def keyset_order_by(self, order_by):
+        """Return the sort order used for keyset pagination, i.e. the specified sort order with the product uuid
+        appended (if not already present) to obtain a total ordering.
+
+        """
+        names = [item[1:] if item.startswith("+") or item.startswith("-") else item for item in order_by]
+        if "core.uuid" in names:
+            return list(order_by)
+        return list(order_by) + ["+core.uuid"]
+
+    def _build_keyset_condition(self, order_by_items, values):
+        # Build a condition that selects the rows that come after the row with the specified sort key values.
+        #
+        # If all keys are sorted in the same direction and the comparison does not depend on NULL values, a row value
+        # comparison is used, i.e. (k0, k1, k2) > (v0, v1, v2), which the database can serve using a single index range
+        # scan. Otherwise, the condition is expanded, taking the sort direction of each key and the position of NULL
+        # values in the sort order into account, i.e.:
+        #     k0 > v0 OR (k0 = v0 AND k1 > v1) OR (k0 = v0 AND k1 = v1 AND k2 > v2) ...
+        if len(values) != len(order_by_items):
+            raise Error("continuation token does not match sort order")
+
+        keys, parameters = [], {}
+        for index, (item, value) in enumerate(zip(order_by_items, values)):
+            descending = item.startswith("-")
+            name = item[1:] if item.startswith("+") or descending else item
+            namespace, name = name.split(".")
+            optional = self._namespace_schema(namespace).is_optional(name)
+            if value is None and not optional:
+                raise Error("cannot paginate on sort key %r; value is undefined" % (namespace + "." + name))
+
+            # NULL values come first if they sort low and the key is sorted in ascending order, or vice versa.
+            nulls_first = descending != self._nulls_sort_low
+            placeholder = self._named_placeholder("after%d" % index)
+            keys.append((self._column_name(namespace, name), descending, optional, nulls_first, placeholder, value))
+            if value is not None:
+                parameters["after%d" % index] = value
+
+        # A row value comparison excludes rows for which a key is NULL, which is only correct if NULL values come first.
+        if len(set(key[1] for key in keys)) == 1 and all(key[5] is not None and (key[3] or not key[2]) for key in keys):
+            return "(%s) %s (%s)" % (", ".join(key[0] for key in keys), "<" if keys[0][1] else ">",
+                                     ", ".join(key[4] for key in keys)), parameters
+
+        terms, equal = [], []
+        for column, descending, optional, nulls_first, placeholder, value in keys:
+            if value is None:
+                # Only non-NULL values can come after a NULL value.
+                after = "%s IS NOT NULL" % column if nulls_first else None
+                equal_term = "%s IS NULL" % column
+            else:
+                after = "%s %s %s" % (column, "<" if descending else ">", placeholder)
+                if optional and not nulls_first:
+                    after = "(%s OR %s IS NULL)" % (after, column)
+                equal_term = "%s = %s" % (column, placeholder)
+
+            if after is not None:
+                terms.append("(%s)" % " AND ".join(equal + [after]))
+            equal.append(equal_term)
+
+        return " OR ".join(terms) or "0 = 1", parameters
+
     def _build_order_by_list(self, order_by_items):
         order_by_list, namespaces = [], set()
         for item in order_by_items:
@@ -633,6 +778,39 @@ class SQLBuilder(object):
 
         return order_by_list, namespaces
 
+    def _compile_where(self, where, parameters, timings=None):
+        # Return the SQL expression that corresponds to the specified search expression, the values of the parameters
+        # of the SQL expression (by placeholder name), and the namespaces referred to.
+        #
+        # Compiling a search expression (tokenizing, parsing, semantic analysis, and SQL generation) is relatively
+        # expensive. Compiled expressions are therefore cached, keyed on the expression and the types of the parameters.
+        # Parameter values are bound to the cached SQL expression for each call.
+        #
+        # If timings is not None, the cache is bypassed and the time spent (in seconds) parsing and analyzing the
+        # expression is stored in timings under the keys "parse" and "analyze".
+        key = (where, _parameter_types(parameters))
+        compiled = None if timings is not None else self._query_cache.get(key)
+        if compiled is None:
+            start = time.time()
+            ast = parse(where)
+            parsed = time.time()
+            ast = analyze(ast, self._namespace_schemas, parameters or {})
+            if timings is not None:
+                timings["parse"] = parsed - start
+                timings["analyze"] = time.time() - parsed
+            visitor = _WhereExpressionVisitor(self._rewriter_table, self._column_name, self._named_placeholder)
+            where_expr, literals, references, namespaces = visitor.visit(ast)
+            compiled = where_expr, literals, references, frozenset(namespaces)
+            self._query_cache.put(key, compiled)
+
+        where_expr, literals, references, namespaces = compiled
+        where_parameters = dict(literals)
+        for name, reference in references.items():
+            value = parameters[reference]
+            # Sequences of values (see the "in" operator) are always bound as a list.
+            where_parameters[name] = list(value) if isinstance(value, tuple) else value
+        return where_expr, where_parameters, namespaces
+
     def _column_name(self, namespace, identifier):
         return self._table_name(namespace) + "." + identifier
 
@@ -5,10 +5,15 @@
 from __future__ import absolute_import, division, print_function
 
 from muninn._compat import dictkeys, dictvalues
+from muninn._compat import string_types as basestring
+import collections
 import os
 import re
 import datetime
 import functools
+import inspect
+import json
+import time
 import uuid
 
 # Select a version of dbapi2 that's available.
@@ -27,8 +32,19 @@ import muninn.geometry as geometry
 
 from muninn.exceptions import *
 from muninn.function import Prototype
+from muninn.language import BooleanSequence, EmptySequence, LongSequence, RealSequence, TextSequence, \
+    TimestampSequence, UUIDSequence
 from muninn.schema import *
-from muninn.struct import Struct
+from muninn.struct import Row, RowDescription, Struct
+
+
+# Maximum number of parameters used in a single statement (the default limit of SQLite versions before 3.32.0).
+_MAX_VARIABLES = 999
+
+
+def _chunks(sequence, size):
+    for start in range(0, len(sequence), size):
+        yield sequence[start:start + size]
 
 
 class _SQLiteConfig(Mapping):
@@ -37,6 +53,8 @@ class _SQLiteConfig(Mapping):
     connection_string = Text
     mod_spatialite_path = optional(Text)
     table_prefix = optional(Text)
+    persistent_connection = optional(Boolean)
+    connection_max_idle_time = optional(Integer)
 
 
 def create(configuration):
@@ -51,31 +69,44 @@ class SQLiteError(Error):
         super(SQLiteError, self).__init__(message)
 
 
-def translate_sqlite_errors(func):
-    """Decorator that translates sqlite dbapi exceptions into muninn exceptions."""
-    @functools.wraps(func)
-    def translate_sqlite_errors_(*args, **kwargs):
+def _translate_sqlite_error(_error):
+    try:
+        message = _error.diag.message_primary
+    except AttributeError:
+        message = None
+
+    if message:
         try:
-            return func(*args, **kwargs)
-        except dbapi2.Error as _error:
-            try:
-                message = _error.diag.message_primary
-            except AttributeError:
-                message = None
+            message_detail = _error.diag.message_detail
+        except AttributeError:
+            message_detail = None
 
-            if message:
-                try:
-                    message_detail = _error.diag.message_detail
-                except AttributeError:
-                    message_detail = None
+        if message_detail:
+            message += " [" + message_detail + "]"
+    else:
+        # Remove newlines and excessive whitespace from the original SQLite exception message.
+        message = " ".join(str(_error).split())
 
-                if message_detail:
-                    message += " [" + message_detail + "]"
-            else:
-                # Remove newlines and excessive whitespace from the original SQLite exception message.
-                message = " ".join(str(_error).split())
+    return SQLiteError(message)
 
-            raise SQLiteError(message)
+
+def translate_sqlite_errors(func):
+    """Decorator that translates sqlite dbapi exceptions into muninn exceptions."""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def translate_sqlite_errors_(*args, **kwargs):
+            try:
+                for item in func(*args, **kwargs):
+                    yield item
+            except dbapi2.Error as _error:
+                raise _translate_sqlite_error(_error)
+    else:
+        @functools.wraps(func)
+        def translate_sqlite_errors_(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except dbapi2.Error as _error:
+                raise _translate_sqlite_error(_error)
 
     return translate_sqlite_errors_
 
@@ -85,6 +116,21 @@ def _adapt_geometry(geometry):
     return dbapi2.Binary(blobgeometry.encode_blob_geometry(geometry))
 
 
+def _adapt_sequence(sequence):
+    """Return the JSON representation of a sequence of values, as used to bind a sequence of values to a single
+    parameter. Values are represented in the same way as when they are bound to a parameter directly."""
+    values = []
+    for value in sequence:
+        if isinstance(value, uuid.UUID):
+            value = value.hex
+        elif isinstance(value, datetime.datetime):
+            value = value.isoformat(" ")
+        elif isinstance(value, bool):
+            value = int(value)
+        values.append(value)
+    return json.dumps(values)
+
+
 def _cast_geometry(blob):
     """Construct a Geometry instance from its SQLite BLOB-Geometry representation."""
     if blob is None:
@@ -99,13 +145,22 @@ class SQLiteConnection(object):
     Only non-nested transactions are supported, no auto-commit or nested transactions. A transaction can be started
     using the context manager interface.
 
+    By default, the connection is closed at the end of each transaction. If persistent is set to True, the connection
+    (including the loaded mod_spatialite extension) is kept open across transactions. A persistent connection is
+    re-established if it has been idle for more than max_idle_time seconds (0 means no limit), or if it is used from a
+    different process than the one that created it (e.g. after a fork by the multiprocessing module).
+
     """
-    def __init__(self, connection_string, mod_spatialite_path, backend):
+    def __init__(self, connection_string, mod_spatialite_path, backend, persistent=False, max_idle_time=0):
         self._connection_string = connection_string
         self._mod_spatialite = mod_spatialite_path
         self._connection = None
         self._in_transaction = False
         self._backend = backend
+        self._persistent = persistent
+        self._max_idle_time = max_idle_time
+        self._pid = None
+        self._last_used = None
 
     def __enter__(self):
         # Begin a transaction. The transaction is not started immediately, but a state change is recorded such that
@@ -115,6 +170,15 @@ class SQLiteConnection(object):
         if self._in_transaction:
             raise InternalError("nested transactions are not supported")
 
+        # A connection inherited from a parent process should not be used by the child process; drop the reference.
+        if self._connection is not None and self._pid != os.getpid():
+            self._connection = None
+
+        # Drop a persistent connection that has been idle for too long.
+        if self._connection is not None and self._max_idle_time > 0 and \
+                time.time() - self._last_used > self._max_idle_time:
+            self._disconnect()
+
         # Reconnect if necessary.
         if self._connection is None:
             self._connect()
@@ -133,12 +197,15 @@ class SQLiteConnection(object):
                 self._connection.rollback()
         finally:
             self._in_transaction = False
-            self.close()
+            self._last_used = time.time()
+            if not self._persistent:
+                self.close()
 
     def _connect(self):
         # Re-establish the connection to the database.
         need_prepare = not os.path.exists(self._connection_string)
         self._connection = dbapi2.connect(self._connection_string, detect_types=dbapi2.PARSE_DECLTYPES)
+        self._pid = os.getpid()
 
         # make sure that foreign keys are enabled
         self._connection.execute("PRAGMA foreign_keys = ON;")
@@ -221,13 +288,16 @@ class SQLiteConnection(object):
 
 
 class SQLiteBackend(object):
-    def __init__(self, connection_string="", mod_spatialite_path="mod_spatialite", table_prefix=""):
+    def __init__(self, connection_string="", mod_spatialite_path="mod_spatialite", table_prefix="",
+                 persistent_connection=False, connection_max_idle_time=0):
         dbapi2.register_converter("BOOLEAN", lambda x: bool(int(x)))
         dbapi2.register_adapter(bool, lambda x: int(x))
 
         dbapi2.register_converter("UUID", lambda x: uuid.UUID(x.decode()))
         dbapi2.register_adapter(uuid.UUID, lambda x: x.hex)
 
+        dbapi2.register_adapter(list, _adapt_sequence)
+
         dbapi2.register_converter("GEOMETRY", _cast_geometry)
         dbapi2.register_adapter(geometry.Point, _adapt_geometry)
         dbapi2.register_adapter(geometry.LineString, _adapt_geometry)
@@ -237,7 +307,8 @@ class SQLiteBackend(object):
         dbapi2.register_adapter(geometry.MultiPolygon, _adapt_geometry)
 
         self._connection_string = connection_string
-        self._connection = SQLiteConnection(connection_string, mod_spatialite_path, self)
+        self._connection = SQLiteConnection(connection_string, mod_spatialite_path, self, persistent_connection,
+                                            connection_max_idle_time)
 
         if table_prefix and not re.match(r"[a-z][_a-z]*(\.[a-z][_a-z]*)*", table_prefix):
             raise ValueError("invalid table_prefix %s" % table_prefix)
@@ -251,6 +322,24 @@ class SQLiteBackend(object):
         self._sql_builder = sql.SQLBuilder({}, sql.TypeMap(), {}, self._table_name, self._placeholder,
                                            self._placeholder, self._rewriter_property)
 
+    def _create_index_sql(self, namespace, names):
+        schema = self._namespace_schema(namespace)
+        if not names:
+            raise Error("no properties specified for index on namespace: %r" % namespace)
+        for name in names:
+            if name not in schema:
+                raise Error("no property: %r defined within namespace: %r" % (name, namespace))
+
+        table_name = self._table_name(namespace)
+        index_name = "idx_%s_%s" % (table_name, "_".join(names))
+        if any(self._type_map()[schema[name]] == "GEOMETRY" for name in names):
+            if len(names) != 1:
+                raise Error("geometry properties cannot be part of a multi-column index: %s" %
+                            ", ".join(namespace + "." + name for name in names))
+            # Spatialite stores the spatial index as a virtual table called idx_<table>_<column>.
+            return index_name, "SELECT CreateSpatialIndex('%s', '%s')" % (table_name, names[0])
+        return index_name, "CREATE INDEX %s ON %s (%s)" % (index_name, table_name, ", ".join(names))
+
     def _create_tables_sql(self):
         result = []
         # Create the table for the core namespace.
@@ -300,6 +389,7 @@ class SQLiteBackend(object):
                 if self._type_map()[schema[name]] == "GEOMETRY":
                     result.append("SELECT AddGeometryColumn('%s', '%s', 4326, 'GEOMETRY', 2)" %
                                   (self._table_name(namespace), name))
+            result.extend(sql for _, sql in self._namespace_indexes(namespace))
 
         # We use explicit 'id' primary keys for the links and tags tables so the entries can be managed using
         # other front-ends that may not support tuples as primary keys.
@@ -334,6 +424,21 @@ class SQLiteBackend(object):
         finally:
             cursor.close()
 
+    def _delete_product_properties_many(self, uuids):
+        uuids = list(set(uuids))
+        cursor = self._connection.cursor()
+        try:
+            for chunk in _chunks(uuids, _MAX_VARIABLES):
+                placeholders = ", ".join([self._placeholder()] * len(chunk))
+                cursor.execute("DELETE FROM %s WHERE source_uuid IN (%s)" % (self._link_table_name, placeholders),
+                               chunk)
+                cursor.execute("DELETE FROM %s WHERE uuid IN (%s)" % (self._core_table_name, placeholders), chunk)
+
+                if cursor.rowcount != len(chunk):
+                    raise Error("could not delete properties for %d product(s)" % (len(chunk) - cursor.rowcount))
+        finally:
+            cursor.close()
+
     def _derived_products(self, uuid):
         query = "SELECT uuid FROM %s WHERE source_uuid = %s" % (self._link_table_name, self._placeholder())
         parameters = (uuid,)
@@ -357,6 +462,11 @@ class SQLiteBackend(object):
                     schema = self._namespace_schema(namespace)
                     for name in schema:
                         if self._type_map()[schema[name]] == "GEOMETRY":
+                            if namespace != "core":
+                                # remove spatial index (if any)
+                                cursor.execute("SELECT DisableSpatialIndex('%s', '%s')" %
+                                               (self._table_name(namespace), name))
+                                cursor.execute("DROP TABLE IF EXISTS idx_%s_%s" % (self._table_name(namespace), name))
                             cursor.execute("SELECT DiscardGeometryColumn('%s', '%s')" %
                                            (self._table_name(namespace), name))
                 # then remove the tables
@@ -379,32 +489,73 @@ class SQLiteBackend(object):
         finally:
             cursor.close()
 
-    def _find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta()):
+    def _find_derived_products(self, uuids):
+        result = []
+        cursor = self._connection.cursor()
+        try:
+            for chunk in _chunks(list(uuids), _MAX_VARIABLES):
+                # Walk the link table starting from the specified products. Using UNION (instead of UNION ALL) ensures
+                # each product is visited only once, even if the links contain cycles.
+                query = "WITH RECURSIVE derived(uuid) AS (SELECT uuid FROM %s WHERE source_uuid IN (%s) UNION " \
+                        "SELECT link.uuid FROM %s AS link JOIN derived ON (link.source_uuid = derived.uuid)) " \
+                        "SELECT uuid FROM %s WHERE uuid IN (SELECT uuid FROM derived)" % \
+                        (self._link_table_name, ", ".join([self._placeholder()] * len(chunk)), self._link_table_name,
+                         self._core_table_name)
+                cursor.execute(query, chunk)
+                result.extend(row[0] for row in cursor)
+        finally:
+            cursor.close()
+
+        return list(set(result))
+
+    def _find_products(self, query, parameters, uuids=None):
+        # Execute a query that selects the core properties of products. If uuids is not None, only the specified
+        # products are considered. The products are then selected in chunks, to limit the number of parameters per
+        # statement.
+        core_properties = list(self._namespace_schema("core"))
+        description = [("core", core_properties)]
+
+        result = []
+        cursor = self._connection.cursor()
+        try:
+            if uuids is None:
+                cursor.execute(query, parameters)
+                result.extend(self._unpack_product_properties(description, row) for row in cursor)
+            else:
+                for chunk in _chunks(list(uuids), _MAX_VARIABLES):
+                    cursor.execute("%s AND %s.uuid IN (%s)" % (query, self._core_table_name,
+                                                               ", ".join([self._placeholder()] * len(chunk))),
+                                   list(parameters) + list(chunk))
+                    result.extend(self._unpack_product_properties(description, row) for row in cursor)
+        finally:
+            cursor.close()
+
+        return result
+
+    def _find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta(),
+                                                uuids=None):
         core_properties = list(self._namespace_schema("core"))
         select_list = ["%s.%s" % (self._core_table_name, name) for name in core_properties]
 
+        # Select products that have at least one link, none of which refers to a source product that is either
+        # available or not present in the catalogue.
         query = "SELECT %s FROM %s WHERE active AND strftime('%%s', 'now') - strftime('%%s', archive_date) > %s AND " \
-                "uuid IN (SELECT uuid FROM %s EXCEPT SELECT DISTINCT link.uuid FROM %s AS link LEFT JOIN %s AS " \
-                "source ON (link.source_uuid = source.uuid) WHERE source.uuid IS NULL OR source.archive_path IS NOT " \
-                "NULL)" % (", ".join(select_list), self._core_table_name, self._placeholder(), self._link_table_name,
-                           self._link_table_name, self._core_table_name)
+                "EXISTS (SELECT 1 FROM %s AS link WHERE link.uuid = %s.uuid) AND NOT EXISTS (SELECT 1 FROM %s AS " \
+                "link LEFT JOIN %s AS source ON (link.source_uuid = source.uuid) WHERE link.uuid = %s.uuid AND " \
+                "(source.uuid IS NULL OR source.archive_path IS NOT NULL))" % \
+                (", ".join(select_list), self._core_table_name, self._placeholder(), self._link_table_name,
+                 self._core_table_name, self._link_table_name, self._core_table_name, self._core_table_name)
 
         if product_type is not None:
             query = "%s AND product_type = %s" % (query, self._placeholder())
 
         grace_period = grace_period.total_seconds()
 
-        cursor = self._connection.cursor()
-        try:
-            cursor.execute(query, (grace_period,) if product_type is None else (grace_period, product_type))
-
-            description = [("core", core_properties)]
-            return [self._unpack_product_properties(description, row) for row in cursor]
-        finally:
-            cursor.close()
+        return self._find_products(query, (grace_period,) if product_type is None else (grace_period, product_type),
+                                   uuids)
 
     def _find_products_without_source(self, product_type=None, grace_period=datetime.timedelta(),
-                                      archived_only=False):
+                                      archived_only=False, uuids=None):
         core_properties = list(self._namespace_schema("core"))
         select_list = ["%s.%s" % (self._core_table_name, name) for name in core_properties]
         query = "SELECT %s FROM %s WHERE %s.active AND strftime('%%s', 'now') - strftime('%%s', %s.archive_date) > " \
@@ -420,12 +571,15 @@ class SQLiteBackend(object):
 
         grace_period = grace_period.total_seconds()
 
+        return self._find_products(query, (grace_period,) if product_type is None else (grace_period, product_type),
+                                   uuids)
+
+    def _index_exists(self, index_name):
+        query = "SELECT name FROM sqlite_master WHERE name=%s COLLATE NOCASE" % (self._placeholder(),)
         cursor = self._connection.cursor()
         try:
-            cursor.execute(query, (grace_period,) if product_type is None else (grace_period, product_type))
-
-            description = [("core", core_properties)]
-            return [self._unpack_product_properties(description, row) for row in cursor]
+            cursor.execute(query, (index_name,))
+            return len(cursor.fetchall()) != 0
         finally:
             cursor.close()
 
@@ -454,6 +608,32 @@ class SQLiteBackend(object):
         finally:
             cursor.close()
 
+    def _insert_namespace_properties_many(self, name, properties_list):
+        # Group the properties by the set of fields they define, such that all properties in a group can be inserted
+        # using a single (batched) INSERT query.
+        groups = collections.OrderedDict()
+        for uuid, properties in properties_list:
+            self._validate_namespace_properties(name, properties)
+            assert uuid is not None and getattr(properties, "uuid", uuid) == uuid
+
+            properties_dict = vars(properties)
+            fields = sorted(properties_dict)
+            parameters = [properties_dict[field] for field in fields]
+            if "uuid" not in properties_dict:
+                fields.append("uuid")
+                parameters.append(uuid)
+
+            groups.setdefault(tuple(fields), []).append(parameters)
+
+        cursor = self._connection.cursor()
+        try:
+            for fields, parameters_list in groups.items():
+                query = "INSERT INTO %s (%s) VALUES (%s)" % (self._table_name(name), ", ".join(fields),
+                                                             ", ".join([self._placeholder()] * len(fields)))
+                cursor.executemany(query, parameters_list)
+        finally:
+            cursor.close()
+
     def _link(self, uuid, source_uuids):
         query = "INSERT OR IGNORE INTO %s (uuid, source_uuid) VALUES (%s, %s)" % \
             (self._link_table_name, self._placeholder(), self._placeholder())
@@ -466,6 +646,15 @@ class SQLiteBackend(object):
                 finally:
                     cursor.close()
 
+    def _namespace_indexes(self, namespace):
+        # Namespaces declare indexes using an '_indexes' attribute: a list of property names and / or tuples of
+        # property names (for multi-column indexes).
+        result = []
+        for index in getattr(self._namespace_schema(namespace), "_indexes", []):
+            names = (index,) if isinstance(index, basestring) else tuple(index)
+            result.append(self._create_index_sql(namespace, names))
+        return result
+
     def _namespace_schema(self, namespace):
         try:
             return self._namespace_schemas[namespace]
@@ -475,6 +664,13 @@ class SQLiteBackend(object):
     def _placeholder(self, name=""):
         return "?" if not name else ":%s" % name
 
+    def _product_unpacker(self, description, compact=False):
+        # Compact rows share a single description and wrap the row as returned by the database. Contrary to Struct
+        # based results, they are not validated against the namespace schemas.
+        if compact:
+            return functools.partial(Row, RowDescription(description, self._namespace_schema))
+        return functools.partial(self._unpack_product_properties, description)
+
     def _rewriter_property(self, column_name, subscript):
         # timestamp
         if subscript == 'year':
@@ -505,6 +701,29 @@ class SQLiteBackend(object):
         rewriter_table[Prototype("~=", (Text, Text), Boolean)] = \
             lambda arg0, arg1: "(%s) LIKE (%s) ESCAPE '\\'" % (arg0, arg1)
 
+        #
+        # Set membership operator. The sequence of values is bound as a single parameter (encoded as JSON, see
+        # _adapt_sequence()).
+        #
+        in_rewriter = lambda arg0, arg1: "(%s IN (SELECT value FROM json_each(%s)))" % (arg0, arg1)
+        rewriter_table[Prototype("in", (Long, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, LongSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Long, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, RealSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Boolean, BooleanSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Text, TextSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Timestamp, TimestampSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (UUID, UUIDSequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Long, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Integer, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Real, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Boolean, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Text, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (Timestamp, EmptySequence), Boolean)] = in_rewriter
+        rewriter_table[Prototype("in", (UUID, EmptySequence), Boolean)] = in_rewriter
+
         #
         # Functions.
         #
@@ -700,11 +919,28 @@ class SQLiteBackend(object):
             finally:
                 cursor.close()
 
+    @translate_sqlite_errors
+    def create_index(self, namespace, names, dry_run=False):
+        index_name, sql = self._create_index_sql(namespace, tuple(names))
+        with self._connection:
+            if self._index_exists(index_name):
+                return []
+            if not dry_run:
+                self._execute_list([sql])
+        return [sql]
+
     @translate_sqlite_errors
     def delete_product_properties(self, uuid):
         with self._connection:
             self._delete_product_properties(uuid)
 
+    @translate_sqlite_errors
+    def delete_product_properties_many(self, uuids):
+        """Delete the properties of multiple products (and the links to these products) using a single transaction.
+        Either all products are deleted, or none of them are."""
+        with self._connection:
+            self._delete_product_properties_many(uuids)
+
     @translate_sqlite_errors
     def derived_products(self, uuid):
         with self._connection:
@@ -722,6 +958,48 @@ class SQLiteBackend(object):
         automatically when required."""
         self._connection.close()
 
+    @translate_sqlite_errors
+    def explain(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                analyze=False, unpack=False):
+        """Return the SQL query that corresponds to a search, the parameters bound to the query, the query plan, and
+        the time spent (in seconds) on each step of the search. If analyze is True, the query is executed, and the
+        time spent executing the query is included. If unpack is True as well, the time spent unpacking the results is
+        included."""
+        timings = collections.OrderedDict([("parse", 0.0), ("analyze", 0.0)])
+        start = time.time()
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 timings=timings)
+        timings["build"] = time.time() - start - timings["parse"] - timings["analyze"]
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                # Each row of the query plan refers to its parent row, which is used to indent the plan.
+                cursor.execute("EXPLAIN QUERY PLAN " + query, query_parameters)
+                plan, depth = [], {}
+                for row in cursor:
+                    depth[row[0]] = depth.get(row[1], -1) + 1
+                    plan.append("  " * depth[row[0]] + row[-1])
+
+                if analyze:
+                    start = time.time()
+                    cursor.execute(query, query_parameters)
+                    rows = cursor.fetchall()
+                    timings["execute"] = time.time() - start
+
+                    if unpack:
+                        start = time.time()
+                        for row in rows:
+                            self._unpack_product_properties(query_description, row)
+                        timings["unpack"] = time.time() - start
+            finally:
+                cursor.close()
+
+        result = Struct()
+        result.query, result.parameters, result.plan, result.timings = query, query_parameters, plan, timings
+        return result
+
     def exists(self):
         if not os.path.isfile(self._connection_string):
             return False
@@ -736,7 +1014,17 @@ class SQLiteBackend(object):
                 cursor.close()
 
     @translate_sqlite_errors
-    def find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta()):
+    def find_derived_products(self, uuids):
+        """Return the uuids of all products that are derived, directly or indirectly, from one or more of the specified
+           products.
+
+        """
+        with self._connection:
+            return self._find_derived_products(uuids)
+
+    @translate_sqlite_errors
+    def find_products_without_available_source(self, product_type=None, grace_period=datetime.timedelta(),
+                                               uuids=None):
         """Return the core properties of all products that are linked to one or more source products, all of which are
            unavailable. A product is unavailable if there is no data associated with it, only properties. Products that
            have links to external source products will not be selected by this function, because it cannot be
@@ -744,22 +1032,24 @@ class SQLiteBackend(object):
 
            Keyword arguments:
            product_type --  Only consider products of the specified product type.
+           uuids        --  Only consider the products with the specified uuids.
 
         """
         with self._connection:
-            return self._find_products_without_available_source(product_type, grace_period)
+            return self._find_products_without_available_source(product_type, grace_period, uuids)
 
     @translate_sqlite_errors
     def find_products_without_source(self, product_type=None, grace_period=datetime.timedelta(),
-                                     archived_only=False):
+                                     archived_only=False, uuids=None):
         """Return the core properties of all products that are not linked to any source products.
 
            Keyword arguments:
            product_type --  Only consider products of the specified product type.
+           uuids        --  Only consider the products with the specified uuids.
 
         """
         with self._connection:
-            return self._find_products_without_source(product_type, grace_period, archived_only)
+            return self._find_products_without_source(product_type, grace_period, archived_only, uuids)
 
     def initialize(self, namespace_schemas):
         self._namespace_schemas = namespace_schemas
@@ -776,6 +1066,69 @@ class SQLiteBackend(object):
                     continue
                 self._insert_namespace_properties(properties.core.uuid, ns_name, ns_properties)
 
+    @translate_sqlite_errors
+    def insert_product_properties_many(self, properties_list):
+        """Insert the properties of multiple products using a single transaction. Either all products are inserted, or
+        none of them are."""
+        namespaces = collections.OrderedDict([("core", [])])
+        for properties in properties_list:
+            for ns_name, ns_properties in vars(properties).items():
+                namespaces.setdefault(ns_name, []).append((properties.core.uuid, ns_properties))
+
+        with self._connection:
+            for ns_name, ns_properties_list in namespaces.items():
+                if ns_properties_list:
+                    self._insert_namespace_properties_many(ns_name, ns_properties_list)
+
+    @translate_sqlite_errors
+    def iter_search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                    batch_size=1000, after=None, compact=False):
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 after)
+        unpack = self._product_unpacker(query_description, compact)
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute(query, query_parameters)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield unpack(row)
+            finally:
+                cursor.close()
+
+    @translate_sqlite_errors
+    def iter_search_rows(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+                         batch_size=1000):
+        """Return the description of the search result, and an iterator over batches of rows as returned by the
+        database. The description is a list of (namespace, identifiers) tuples. For all namespaces other than "core",
+        the first identifier is "uuid", which is None if the product does not occur in the namespace."""
+        query, query_parameters, query_description = \
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names)
+
+        @translate_sqlite_errors
+        def batches():
+            with self._connection:
+                cursor = self._connection.cursor()
+                try:
+                    cursor.execute(query, query_parameters)
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    cursor.close()
+
+        return query_description, batches()
+
+    def keyset_order_by(self, order_by):
+        return self._sql_builder.keyset_order_by(order_by)
+
     @translate_sqlite_errors
     def link(self, uuid, source_uuids):
         self._link(uuid, source_uuids)
@@ -794,9 +1147,49 @@ class SQLiteBackend(object):
         return sqls
 
     @translate_sqlite_errors
-    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[]):
+    def prepare_indexes(self, dry_run=False):
+        sqls = []
+        with self._connection:
+            for namespace in self._namespace_schemas:
+                for index_name, sql in self._namespace_indexes(namespace):
+                    if not self._index_exists(index_name):
+                        sqls.append(sql)
+            if not dry_run:
+                self._execute_list(sqls)
+        return sqls
+
+    def query_cache_info(self):
+        """Return the number of hits and misses, the maximum size, and the current size of the cache of compiled search
+        expressions."""
+        return self._sql_builder.cache_info()
+
+    @translate_sqlite_errors
+    def search(self, where="", order_by=[], limit=None, parameters={}, namespaces=[], property_names=[],
+               after=None, compact=False):
         query, query_parameters, query_description = \
-            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names)
+            self._sql_builder.build_search_query(where, order_by, limit, parameters, namespaces, property_names,
+                                                 after)
+        unpack = self._product_unpacker(query_description, compact)
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute(query, query_parameters)
+                return [unpack(row) for row in cursor]
+            finally:
+                cursor.close()
+
+    @translate_sqlite_errors
+    def search_by_name(self, product_name, product_type=None, namespaces=[], property_names=[]):
+        """Return the properties of the products with the specified name (and product type, if specified). The lookup
+        is performed directly on the (product_type, product_name) key, without parsing a search expression."""
+        query, _, query_description = self._sql_builder.build_search_query(namespaces=namespaces,
+                                                                          property_names=property_names)
+        query = "%s WHERE %s.product_name = %s" % (query, self._core_table_name, self._placeholder())
+        query_parameters = [product_name]
+        if product_type is not None:
+            query = "%s AND %s.product_type = %s" % (query, self._core_table_name, self._placeholder())
+            query_parameters.append(product_type)
 
         with self._connection:
             cursor = self._connection.cursor()
@@ -806,6 +1199,26 @@ class SQLiteBackend(object):
             finally:
                 cursor.close()
 
+    @translate_sqlite_errors
+    def search_by_uuids(self, uuids, namespaces=[], property_names=[]):
+        """Return the properties of the products with the specified uuids (in no particular order). Products that do
+        not exist are ignored."""
+        query, _, query_description = self._sql_builder.build_search_query(namespaces=namespaces,
+                                                                          property_names=property_names)
+
+        result = []
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                for chunk in _chunks(list(uuids), _MAX_VARIABLES):
+                    cursor.execute("%s WHERE %s.uuid IN (%s)" % (query, self._core_table_name,
+                                                                 ", ".join([self._placeholder()] * len(chunk))), chunk)
+                    result.extend(self._unpack_product_properties(query_description, row) for row in cursor)
+            finally:
+                cursor.close()
+
+        return result
+
     @translate_sqlite_errors
     def server_time_utc(self):
         return datetime.datetime.utcnow()
@@ -832,6 +1245,23 @@ class SQLiteBackend(object):
     def tag(self, uuid, tags):
         self._tag(uuid, tags)
 
+    @translate_sqlite_errors
+    def tag_many(self, uuid_tags):
+        """Set tags on multiple products using a single transaction. The tags should be specified as a sequence of
+        (uuid, tags) pairs."""
+        query = "INSERT OR IGNORE INTO %s (uuid, tag) VALUES (%s, %s)" % \
+            (self._tag_table_name, self._placeholder(), self._placeholder())
+        parameters_list = [(uuid, tag) for uuid, tags in uuid_tags for tag in tags]
+        if not parameters_list:
+            return
+
+        with self._connection:
+            cursor = self._connection.cursor()
+            try:
+                cursor.executemany(query, parameters_list)
+            finally:
+                cursor.close()
+
     @translate_sqlite_errors
     def tags(self, uuid):
         with self._connection:
@@ -869,3 +1299,16 @@ class SQLiteBackend(object):
     def untag(self, uuid, tags=None):
         with self._connection:
             self._untag(uuid, tags)
+
+    @translate_sqlite_errors
+    def update_product_properties_many(self, properties_list):
+        """Update the properties of multiple products using a single transaction. The properties of each product should
+        include the core.uuid property. Either all products are updated, or none of them are."""
+        for properties in properties_list:
+            if "core" not in properties or "uuid" not in properties.core:
+                raise Error("no uuid included in the specified product properties")
+
+        with self._connection:
+            for properties in properties_list:
+                for ns_name, ns_properties in vars(properties).items():
+                    self._update_namespace_properties(properties.core.uuid, ns_name, ns_properties)
@@ -19,6 +19,44 @@ from muninn.function import Prototype, FunctionTable
 from muninn.schema import *
 from muninn.visitor import Visitor
 
+
+#
+# Types of sequences of values, used as the right hand side of the set membership operator "in".
+#
+class LongSequence(Sequence):
+    _alias = "long[]"
+    sub_type = Long
+
+
+class RealSequence(Sequence):
+    _alias = "real[]"
+    sub_type = Real
+
+
+class BooleanSequence(Sequence):
+    _alias = "boolean[]"
+    sub_type = Boolean
+
+
+class TextSequence(Sequence):
+    _alias = "text[]"
+    sub_type = Text
+
+
+class TimestampSequence(Sequence):
+    _alias = "timestamp[]"
+    sub_type = Timestamp
+
+
+class UUIDSequence(Sequence):
+    _alias = "uuid[]"
+    sub_type = UUID
+
+
+class EmptySequence(Sequence):
+    _alias = "[]"
+
+
 #
 # Table of all supported operators and functions.
 #
@@ -112,6 +150,27 @@ function_table.add(Prototype(">=", (Timestamp, Timestamp), Boolean))
 
 function_table.add(Prototype("~=", (Text, Text), Boolean))
 
+#
+# Set membership operator.
+#
+function_table.add(Prototype("in", (Long, LongSequence), Boolean))
+function_table.add(Prototype("in", (Integer, LongSequence), Boolean))
+function_table.add(Prototype("in", (Real, LongSequence), Boolean))
+function_table.add(Prototype("in", (Long, RealSequence), Boolean))
+function_table.add(Prototype("in", (Integer, RealSequence), Boolean))
+function_table.add(Prototype("in", (Real, RealSequence), Boolean))
+function_table.add(Prototype("in", (Boolean, BooleanSequence), Boolean))
+function_table.add(Prototype("in", (Text, TextSequence), Boolean))
+function_table.add(Prototype("in", (Timestamp, TimestampSequence), Boolean))
+function_table.add(Prototype("in", (UUID, UUIDSequence), Boolean))
+function_table.add(Prototype("in", (Long, EmptySequence), Boolean))
+function_table.add(Prototype("in", (Integer, EmptySequence), Boolean))
+function_table.add(Prototype("in", (Real, EmptySequence), Boolean))
+function_table.add(Prototype("in", (Boolean, EmptySequence), Boolean))
+function_table.add(Prototype("in", (Text, EmptySequence), Boolean))
+function_table.add(Prototype("in", (Timestamp, EmptySequence), Boolean))
+function_table.add(Prototype("in", (UUID, EmptySequence), Boolean))
+
 function_table.add(Prototype("+", (Long,), Long))
 function_table.add(Prototype("+", (Integer,), Integer))
 function_table.add(Prototype("+", (Real,), Real))
@@ -257,7 +316,7 @@ class TokenStream(object):
 
     def _types_to_string(self, types):
         try:
-            strings = map(TokenType.to_string, types)
+            strings = list(map(TokenType.to_string, types))
         except TypeError:
             return TokenType.to_string(types)
 
@@ -512,9 +571,29 @@ def parse_atom(stream):
         return Name(".".join(parts))
 
     # Literal.
+    return Literal(parse_literal(stream))
+
+
+def parse_literal(stream):
+    if stream.test(TokenType.OPERATOR, ("+", "-")):
+        operator_token = stream.expect(TokenType.OPERATOR, ("+", "-"))
+        token = stream.expect((TokenType.INTEGER, TokenType.REAL))
+        return -token.value if operator_token.value == "-" else token.value
+
     token = stream.expect((TokenType.TEXT, TokenType.TIMESTAMP, TokenType.UUID, TokenType.REAL, TokenType.INTEGER,
                            TokenType.BOOLEAN))
-    return Literal(token.value)
+    return token.value
+
+
+def parse_set(stream):
+    # Sequence of literals.
+    if stream.test(TokenType.OPERATOR, "("):
+        return Literal(parse_sequence(stream, parse_literal))
+
+    # Parameter reference.
+    stream.expect(TokenType.OPERATOR, "@")
+    name_token = stream.expect(TokenType.NAME)
+    return ParameterReference(name_token.value)
 
 
 def parse_term(stream):
@@ -534,6 +613,8 @@ def parse_arithmetic_expression(stream):
 
 def parse_comparison(stream):
     lhs = parse_arithmetic_expression(stream)
+    if stream.accept(TokenType.NAME, "in"):
+        return FunctionCall("in", lhs, parse_set(stream))
     if stream.test(TokenType.OPERATOR, ("<", ">", "==", ">=", "<=", "!=", "~=")):
         operator_token = stream.expect(TokenType.OPERATOR, ("<", ">", "==", ">=", "<=", "!=", "~="))
         return FunctionCall(operator_token.value, lhs, parse_comparison(stream))
@@ -564,7 +645,30 @@ def parse_expression(stream):
     return parse_or_expression(stream)
 
 
+def _sequence_type(sequence):
+    item_types = set(_literal_type(item) for item in sequence)
+    if not item_types:
+        return EmptySequence
+    elif item_types.issubset((Integer, Long)):
+        return LongSequence
+    elif item_types.issubset((Integer, Long, Real)):
+        return RealSequence
+    elif item_types == set((Boolean,)):
+        return BooleanSequence
+    elif item_types == set((Text,)):
+        return TextSequence
+    elif item_types == set((Timestamp,)):
+        return TimestampSequence
+    elif item_types == set((UUID,)):
+        return UUIDSequence
+
+    raise Error("unable to determine type of sequence: %r" % (sequence,))
+
+
 def _literal_type(literal):
+    if isinstance(literal, (list, tuple)):
+        return _sequence_type(literal)
+
     for type in (Text, Timestamp, UUID, Boolean, Integer, Long, Real, Geometry):
         try:
             type.validate(literal)
@@ -2,7 +2,9 @@
 # Copyright (C) 2014-2019 S[&]T, The Netherlands.
 #
 from __future__ import absolute_import, division, print_function
+from muninn._compat import unquote, urlparse
 
+import hashlib
 import logging
 import os
 
@@ -24,7 +26,12 @@ class RemoteBackend(object):
 
 class UrlBackend(RemoteBackend):
 
-    def pull(self, archive, product):
+    def pull(self, archive, product, verify_hash=False):
+        """Pull the product into the archive. If verify_hash is True, the hash of the product is computed while the
+        product is transferred, and matched against the hash from the metadata before the product is moved into its
+        destination within the archive.
+
+        """
         if getattr(product.core, "archive_path", None) is None:
             raise Error("cannot pull files that do not have archive_path set")
 
@@ -40,33 +47,64 @@ class UrlBackend(RemoteBackend):
 
         plugin = archive.product_type_plugin(product.core.product_type)
 
-        # Create a temporary directory and download the product there, then move the product to its
-        # destination within the archive.
+        # Download the product into a staging directory, then move the product to its destination within the
+        # archive. The name of the staging directory only depends on the product, and the staging directory is kept
+        # if the pull fails, such that a subsequent pull of the product can resume partial downloads. Staging
+        # directories are recorded in a journal, such that archive.collect_garbage() can remove the staging directories
+        # of pulls that are not retried.
+        staging_path = os.path.join(abs_archive_path, ".pull-%s" % product.core.uuid.hex)
         try:
-            with util.TemporaryDirectory(prefix=".pull-", suffix="-%s" % product.core.uuid.hex,
-                                         dir=abs_archive_path) as tmp_path:
-
-                # Create enclosing directory if required.
-                if plugin.use_enclosing_directory:
-                    tmp_path = os.path.join(tmp_path, product.core.physical_name)
-                    util.make_path(tmp_path)
-
-                # Define a temp location and download the file
-                tmp_file = os.path.join(tmp_path, product.core.physical_name)
-                downloader = util.Downloader(product.core.remote_url, archive.auth_file())
-                downloader.save(tmp_file)
-
-                # TODO: implement extraction of downloaded archives
-                # for ftp and file check if url ends with 'core.physical_name + <archive ext>'
-                # for http/https check the header for the line:
-                #    Content-Disposition: attachment; filename="**********"
-                # end then use this ***** filename to match against core.physical_name + <archive ext>
-
-                # Move the transferred product into its destination within the archive.
-                if plugin.use_enclosing_directory:
-                    os.rename(tmp_path, abs_product_path)
-                else:
-                    os.rename(tmp_file, abs_product_path)
+            archive._record_pull_staging(product, staging_path)
+            util.make_path(staging_path)
+
+            # Create enclosing directory if required.
+            tmp_path = staging_path
+            if plugin.use_enclosing_directory:
+                tmp_path = os.path.join(tmp_path, product.core.physical_name)
+                util.make_path(tmp_path)
+
+            # Define a temp location and download the file, computing the digests of the files transferred if
+            # required.
+            tmp_file = os.path.join(tmp_path, product.core.physical_name)
+            digests = {} if verify_hash else None
+            if product.core.remote_url.lower().startswith('file://'):
+                # Copy local files directly, using the copy settings of the archive. Partial copies are discarded.
+                if os.path.lexists(tmp_file):
+                    util.remove_path(tmp_file)
+                source_path = unquote(urlparse(product.core.remote_url).path)
+                strategies = util.copy_path(source_path, tmp_file, resolve_root=True,
+                                            strategy=archive._copy_strategy, workers=archive._copy_workers,
+                                            digests=digests)
+                archive._log_copy_strategies(product, strategies)
+            else:
+                downloader = util.Downloader(product.core.remote_url, archive.auth_file(),
+                                             chunk_size=archive._download_chunk_size)
+                digest = downloader.save(tmp_file, resume=True, hash_func=hashlib.sha1 if verify_hash else None,
+                                         validator_file=os.path.join(staging_path, ".validator"))
+                if verify_hash:
+                    digests[tmp_file] = digest
+
+            # TODO: implement extraction of downloaded archives
+            # for ftp and file check if url ends with 'core.physical_name + <archive ext>'
+            # for http/https check the header for the line:
+            #    Content-Disposition: attachment; filename="**********"
+            # end then use this ***** filename to match against core.physical_name + <archive ext>
+
+            # Verify the product hash before the product becomes visible in the archive. A corrupt product is
+            # removed, such that the next pull will not resume from it.
+            if verify_hash and util.product_hash([tmp_file], digests=digests) != product.core.hash:
+                util.remove_path(staging_path)
+                raise Error("pulled product '%s' (%s) has incorrect hash" %
+                            (product.core.product_name, product.core.uuid))
+
+            # Move the transferred product into its destination within the archive.
+            if plugin.use_enclosing_directory:
+                os.rename(tmp_path, abs_product_path)
+            else:
+                os.rename(tmp_file, abs_product_path)
+
+            util.remove_path(staging_path)
+            archive._remove_pull_staging_record(product)
 
         except EnvironmentError as _error:
             raise Error("unable to transfer product to destination path '%s' [%s]" %
@@ -81,7 +119,13 @@ REMOTE_BACKENDS = {
 }
 
 
-def pull(archive, product):
+def pull(archive, product, verify_hash=False):
+    """Pull a remote product into the archive. If verify_hash is True and the product has a hash, the product hash is
+    verified while pulling, if supported by the remote backend. Return True if the product hash has been verified.
+
+    """
+    verify_hash = verify_hash and 'hash' in product.core
+
     # determine the backend to use
     backend = None
     url = product.core.remote_url
@@ -92,4 +136,10 @@ def pull(archive, product):
     if backend is None:
         raise Error("The protocol of '%s' is not supported" % url)
 
+    # Only the built-in backend supports hash verification; custom backends implement pull(archive, product).
+    if isinstance(backend, UrlBackend):
+        backend.pull(archive, product, verify_hash)
+        return verify_hash
+
     backend.pull(archive, product)
+    return False
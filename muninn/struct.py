@@ -4,6 +4,8 @@
 
 from __future__ import absolute_import, division, print_function
 
+import collections
+
 from muninn.exceptions import Error
 
 
@@ -57,3 +59,128 @@ class Struct(object):
                 self[key].update(other_item)
             else:
                 self[key] = other_item
+
+
+_NamespaceLayout = collections.namedtuple("_NamespaceLayout", ["key", "fields", "optional"])
+
+
+class RowDescription(object):
+    """Layout of the product rows returned by a search, shared by all Row instances of the search result.
+
+    The description is a list of (namespace, identifiers) tuples that describes the columns of each row. The identifiers
+    of all namespaces other than "core" start with "uuid", which is None for products that do not occur in the
+    namespace.
+
+    """
+
+    def __init__(self, description, namespace_schema):
+        self.namespaces = collections.OrderedDict()
+        start = 0
+        for namespace, identifiers in description:
+            end = start + len(identifiers)
+            schema = namespace_schema(namespace)
+            key = None
+            if namespace != "core":
+                assert identifiers[0] == "uuid"
+                key, start, identifiers = start, start + 1, identifiers[1:]
+
+            fields = collections.OrderedDict((identifier, index) for index, identifier in enumerate(identifiers, start))
+            optional = frozenset(identifier for identifier in identifiers if schema.is_optional(identifier))
+            self.namespaces[namespace] = _NamespaceLayout(key, fields, optional)
+            start = end
+
+
+class Row(object):
+    """Compact, read-only representation of the properties of a product.
+
+    Contrary to Struct, a Row does not store the properties of a product in per-namespace dictionaries. Instead, it
+    wraps the row returned by the database along with a description that is shared by all rows of a search result.
+    Properties are accessed in the same way as for Struct (e.g. product.core.uuid or product["core"]["uuid"]). Use
+    to_struct() to convert a Row to a (modifiable) Struct.
+
+    """
+    __slots__ = ("_description", "_values")
+
+    def __init__(self, description, values):
+        self._description = description
+        self._values = values
+
+    def _layout(self, name):
+        layout = self._description.namespaces.get(name)
+        if layout is None or (layout.key is not None and self._values[layout.key] is None):
+            return None
+        return layout
+
+    def __getattr__(self, name):
+        layout = None if name.startswith("_") else self._layout(name)
+        if layout is None:
+            raise AttributeError(name)
+        return NamespaceRow(layout, self._values)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._layout(key) is not None
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __iter__(self):
+        return iter([name for name in self._description.namespaces if self._layout(name) is not None])
+
+    def __repr__(self):
+        return "Row(%r)" % dict((name, vars(self[name].to_struct())) for name in self)
+
+    def to_struct(self):
+        """Return the properties of the product as a Struct."""
+        struct = Struct()
+        for name in self:
+            struct[name] = self[name].to_struct()
+        return struct
+
+
+class NamespaceRow(object):
+    """Compact, read-only view of the properties of a product that belong to a single namespace."""
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, layout, values):
+        self._layout = layout
+        self._values = values
+
+    def _defined(self, name):
+        index = self._layout.fields.get(name)
+        return index is not None and (self._values[index] is not None or name not in self._layout.optional)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not self._defined(name):
+            raise AttributeError(name)
+        return self._values[self._layout.fields[name]]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._defined(key)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __iter__(self):
+        return iter([name for name in self._layout.fields if self._defined(name)])
+
+    def __repr__(self):
+        return "NamespaceRow(%r)" % vars(self.to_struct())
+
+    def to_struct(self):
+        """Return the properties as a Struct."""
+        struct = Struct()
+        for name in self:
+            struct[name] = self._values[self._layout.fields[name]]
+        return struct
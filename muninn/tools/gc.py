@@ -0,0 +1,27 @@
+#
+# Copyright (C) 2014-2019 S[&]T, The Netherlands.
+#
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+import muninn
+
+from .utils import create_parser, parse_args_and_run
+
+
+def gc(args):
+    with muninn.open(args.archive) as archive:
+        count = archive.collect_garbage()
+        logging.debug('Removed %d product(s) from the trash', count)
+
+    return 0
+
+
+def main():
+    parser = create_parser(description="Permanently remove products that have been moved into the trash of a muninn "
+                           "archive (see the use_trash archive option), as well as the partial downloads kept for "
+                           "products of which the pull failed.")
+    parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
+    return parse_args_and_run(parser, gc)
@@ -84,22 +84,29 @@ class IngestProcessor(Processor):
         self.force = args.force
         self.tag = args.tag
 
-    def perform_operation(self, archive, path):
-        path = os.path.abspath(path.strip())
-
+    def expand_path(self, path):
         # Expand path into multiple files and/or directories that belong to the same product.
         try:
             product_paths = self.path_expansion_function(path)
         except Error as error:
             logging.error("%s: unable to determine which files or directories belong to product [%s]" % (path, error))
-            return 0
+            return None
 
         # Discard paths matching any of the user supplied exclude patterns.
         if self.exclude:
-            product_paths = filter_paths(product_paths, self.exclude)
+            product_paths = list(filter_paths(product_paths, self.exclude))
 
         if not product_paths:
             logging.error("%s: path does not match any files or directories" % path)
+            return None
+
+        return product_paths
+
+    def perform_operation(self, archive, path):
+        path = os.path.abspath(path.strip())
+
+        product_paths = self.expand_path(path)
+        if product_paths is None:
             return 0
 
         try:
@@ -117,8 +124,33 @@ class IngestProcessor(Processor):
 
         return 1
 
+    def perform_batch_operation(self, archive, paths, batch_size, workers=None):
+        paths = [os.path.abspath(path.strip()) for path in paths]
+
+        products = []
+        for path in paths:
+            product_paths = self.expand_path(path)
+            if product_paths is not None:
+                products.append((path, product_paths))
+
+        results = archive.ingest_many([product_paths for _, product_paths in products], self.product_type,
+                                      use_symlinks=self.use_symlinks, verify_hash=self.verify_hash,
+                                      use_current_path=self.keep, tags=self.tag, workers=workers,
+                                      batch_size=batch_size)
+
+        num_success = 0
+        for (path, _), result in zip(products, results):
+            if isinstance(result, Exception):
+                logging.error("%s: unable to ingest product [%s]" % (path, result))
+            else:
+                num_success += 1
+        return num_success
+
 
 def ingest(args):
+    if args.batch_size is not None and (args.force or args.parallel):
+        raise Error("--batch-size cannot be combined with --force or --parallel")
+
     processor = IngestProcessor(args)
     with muninn.open(args.archive) as archive:
         if "-" in args.path:
@@ -127,7 +159,9 @@ def ingest(args):
             paths = args.path
         total = len(paths)
         num_success = 0
-        if args.parallel:
+        if args.batch_size is not None:
+            num_success = processor.perform_batch_operation(archive, paths, args.batch_size, args.processes)
+        elif args.parallel:
             if args.processes is not None:
                 pool = multiprocessing.Pool(args.processes)
             else:
@@ -171,7 +205,11 @@ def main():
     parser.add_argument("--verify-hash", action="store_true",
                         help="verify the hash of the product after it has been put in the archive")
     parser.add_argument("--parallel", action="store_true", help="use multi-processing to perform ingestion")
-    parser.add_argument("--processes", type=int, help="use a specific amount of processes for --parallel")
+    parser.add_argument("--processes", type=int, help="use a specific amount of processes for --parallel (or "
+                        "threads for --batch-size)")
+    parser.add_argument("--batch-size", type=int, help="ingest products in batches of the specified size, using a "
+                        "single catalogue transaction per batch for each ingestion step (cannot be combined with "
+                        "--force or --parallel)")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     parser.add_argument("path", metavar="PATH", nargs="+", action=CheckProductListAction,
                         help="products to ingest, or \"-\" to read the list of products from standard input")
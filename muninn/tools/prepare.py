@@ -11,7 +11,13 @@ from .utils import create_parser, parse_args_and_run
 
 def prepare(args):
     with muninn.open(args.archive) as archive:
-        if args.dry_run:
+        if args.indexes:
+            sqls = archive.prepare_indexes(dry_run=args.dry_run)
+            if args.dry_run:
+                print("The following SQL statements would be executed:")
+                for sql in sqls:
+                    print("  " + sql)
+        elif args.dry_run:
             print("The following SQL statements would be executed:")
             for sql in archive.prepare_catalogue(dry_run=True):
                 print("  " + sql)
@@ -28,6 +34,8 @@ def main():
                         "without creating (or removing anything from) the archive root path on disk")
     parser.add_argument("-f", "--force", action="store_true",
                         help="force preparation of an existing archive, completely removing its contents")
+    parser.add_argument("-i", "--indexes", action="store_true", help="only create the indexes declared by the "
+                        "namespace definitions that are missing from an existing catalogue")
     parser.add_argument("--dry-run", action="store_true", help="dump the SQL statements without executing them")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     return parse_args_and_run(parser, prepare)
@@ -21,7 +21,8 @@ def pull(args):
             expression = "%s and (%s)" % (expression, args.expression)
 
         logging.debug('Going to pull products that match: %s', expression)
-        num_products = archive.pull(expression, verify_hash=verify_hash)
+        num_products = archive.pull(expression, verify_hash=verify_hash, workers=args.workers,
+                                    max_per_host=args.max_per_host)
         logging.debug('Pulled %d product(s)', num_products)
 
     return 0
@@ -31,6 +32,10 @@ def main():
     parser = create_parser(description="Pull remote files into the archive.")
     parser.add_argument("--verify-hash", action="store_true",
                         help="verify the hash of the product after it has been put in the archive")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="maximum number of products to download concurrently (default: 1)")
+    parser.add_argument("--max-per-host", type=int,
+                        help="maximum number of products to download concurrently from a single host")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     parser.add_argument("expression", metavar="EXPRESSION", help="expression to filter products to pull")
     return parse_args_and_run(parser, pull)
@@ -11,7 +11,7 @@ from .utils import create_parser, parse_args_and_run
 
 def remove(args):
     with muninn.open(args.archive) as archive:
-        archive.remove(args.expression, force=args.force)
+        archive.remove(args.expression, force=args.force, workers=args.workers)
     return 0
 
 
@@ -19,6 +19,8 @@ def main():
     parser = create_parser(description="Remove products from a muninn archive.")
     parser.add_argument("-f", "--force", action="store_true", help="also remove partially ingested products; note"
                         " that this can cause products to be removed while in the process of being ingested")
+    parser.add_argument("--workers", type=int, help="number of threads used to remove products from disk (default: "
+                        "number of CPUs)")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     parser.add_argument("expression", metavar="EXPRESSION", help="expression used to search for products to remove")
     return parse_args_and_run(parser, remove)
@@ -101,19 +101,76 @@ def parse_property_name(name):
     raise ValueError("invalid property name: %r" % name)
 
 
+def _search(archive, args, order_by, property_names):
+    if args.page_size is None and args.resume is None:
+        # Retrieve products in batches while writing the output.
+        for product in archive.iter_search(args.expression, order_by, args.limit, property_names=property_names):
+            yield product
+        return
+
+    # Retrieve products page by page, logging a continuation token after each page such that an interrupted search
+    # can be resumed using --resume.
+    page_size = args.page_size or 1000
+    remaining = args.limit
+    token = args.resume
+    while remaining is None or remaining > 0:
+        limit = page_size if remaining is None else min(page_size, remaining)
+        products, token = archive.search_page(args.expression, order_by, limit, property_names=property_names,
+                                              after=token)
+        for product in products:
+            yield product
+
+        if token is None:
+            break
+        logging.info("to resume after %d more product(s), use: --resume %s" % (len(products), token))
+
+        if remaining is not None:
+            remaining -= len(products)
+
+
 def count(args):
     with muninn.open(args.archive) as archive:
         print(archive.count(args.expression))
     return 0
 
 
+def explain(args):
+    with muninn.open(args.archive) as archive:
+        # Collect possibly multiple sort order specifier lists into a single list.
+        order_by = [] if args.order_by is None else sum(args.order_by, [])
+
+        property_names = []
+        if args.properties is not None:
+            properties = []
+            for (namespace, name) in sum(args.properties, []):
+                _extend_properties(properties, namespace, name, archive)
+            property_names = [".".join(item) for item in properties]
+
+        result = archive.explain(args.expression, order_by, args.limit, property_names=property_names,
+                                 analyze=args.analyze)
+
+        print("query:")
+        print("  %s" % result.query)
+        print("parameters:")
+        for name, value in sorted(result.parameters.items()):
+            print("  %s = %r" % (name, value))
+        print("plan:")
+        for line in result.plan:
+            print("  %s" % line)
+        print("timings:")
+        for step, seconds in result.timings.items():
+            print("  %-8s %10.3f ms" % (step, seconds * 1000.0))
+
+    return 0
+
+
 def uuid(args):
     with muninn.open(args.archive) as archive:
         # Collect possibly multiple sort order specifier lists into a single list.
         order_by = [] if args.order_by is None else sum(args.order_by, [])
 
         # Find products using the search expression and print the UUIDs of the products found.
-        for product in archive.search(args.expression, order_by, args.limit, property_names=['uuid']):
+        for product in _search(archive, args, order_by, property_names=['uuid']):
             print(product.core.uuid)
 
     return 0
@@ -126,8 +183,7 @@ def paths(args):
         order_by = order_by_default if not args.order_by else sum(args.order_by, []) + order_by_default
 
         # Find products using the search expression and print the paths of the products found.
-        products = archive.search(args.expression, order_by, args.limit,
-                                  property_names=['archive_path', 'physical_name'])
+        products = _search(archive, args, order_by, property_names=['archive_path', 'physical_name'])
         for product in products:
             product_path = archive.product_path(product)
             if product_path is not None:
@@ -177,9 +233,8 @@ def search(args):
                 logging.error("no property: %r defined within namespace: %r" % (name, namespace))
                 return 1
 
-        # Find products using the search expression.
-        products = archive.search(args.expression, order_by, args.limit,
-                                  property_names=[".".join(item) for item in properties])
+        # Find products using the search expression. Products are retrieved in batches while writing the output.
+        products = _search(archive, args, order_by, property_names=[".".join(item) for item in properties])
 
         # Output the requested properties of all products matching the search expression in the requested output format.
         if args.output_format == "psv":  # PSV = Pipe Separated Values
@@ -234,8 +289,14 @@ def order_by_list(text):
 
 
 def run(args):
+    if args.analyze and not args.explain:
+        logging.error("--analyze requires --explain")
+        return 1
+
     if args.count:
         return count(args)
+    elif args.explain:
+        return explain(args)
     elif args.uuid:
         return uuid(args)
     elif args.paths:
@@ -249,6 +310,10 @@ def main():
     parser.add_argument("-f", "--output-format", choices=SUPPORTED_FORMATS, default=default_format,
                         help="output format")
     parser.add_argument("-l", "--limit", type=int, help="limit the maximum number of products")
+    parser.add_argument("--page-size", type=int, help="retrieve products in pages of the specified size using keyset "
+                        "pagination; a continuation token is logged after each page")
+    parser.add_argument("--resume", metavar="TOKEN", help="resume a paginated search after the page identified by "
+                        "the specified continuation token (requires the same expression and sort order)")
     parser.add_argument("-o", "--order-by", action="append", type=order_by_list, default=[], help="white space "
                         "separated list of sort order specifiers; a \"+\" prefix denotes ascending order; no prefix "
                         "denotes descending order")
@@ -262,6 +327,12 @@ def main():
                        "of each product found")
     group.add_argument("--paths", action="store_true", help="suppress normal output; instead print the physical "
                        "path of each product found")
+    group.add_argument("--explain", action="store_true", help="suppress normal output; instead print the SQL query "
+                       "that corresponds to the search, its parameters, the query plan, and the time spent on each "
+                       "step of the search")
+    parser.add_argument("--analyze", action="store_true", help="execute the query when using --explain, to include "
+                        "the time spent executing the query (and, for the postgresql backend, the actual run times of "
+                        "the query plan)")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     parser.add_argument("expression", metavar="EXPRESSION", help="expression used to search for products")
 
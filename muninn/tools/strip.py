@@ -11,7 +11,7 @@ from .utils import create_parser, parse_args_and_run
 
 def strip(args):
     with muninn.open(args.archive) as archive:
-        archive.strip(args.expression, force=args.force)
+        archive.strip(args.expression, force=args.force, workers=args.workers)
     return 0
 
 
@@ -21,6 +21,8 @@ def main():
                            "catalogue)")
     parser.add_argument("-f", "--force", action="store_true", help="also strip partially ingested products; note"
                         " that this can cause product files to be removed while in the process of being ingested")
+    parser.add_argument("--workers", type=int, help="number of threads used to remove products from disk (default: "
+                        "number of CPUs)")
     parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
     parser.add_argument("expression", metavar="EXPRESSION", help="expression used to search for products to remove")
     return parse_args_and_run(parser, strip)
@@ -0,0 +1,30 @@
+#
+# Copyright (C) 2014-2019 S[&]T, The Netherlands.
+#
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+import muninn
+
+from .utils import create_parser, parse_args_and_run
+
+
+def verify_hash(args):
+    with muninn.open(args.archive) as archive:
+        failed_products = archive.verify_hash(args.expression, full=args.full)
+        for uuid in failed_products:
+            logging.error("%s: hash verification failed" % uuid)
+
+    return 0 if not failed_products else 1
+
+
+def main():
+    parser = create_parser(description="Verify the hash of products contained in a muninn archive.")
+    parser.add_argument("--full", action="store_true", help="read the contents of all files, even if the hash cache "
+                        "contains the hash of files that have not changed since they were last hashed")
+    parser.add_argument("archive", metavar="ARCHIVE", help="identifier of the archive to use")
+    parser.add_argument("expression", metavar="EXPRESSION", default="", nargs="?",
+                        help="expression used to search for products to verify")
+    return parse_args_and_run(parser, verify_hash)
@@ -8,12 +8,23 @@ from muninn._compat import urlparse
 
 import errno
 import hashlib
+import mmap
+import multiprocessing
+import multiprocessing.pool
 import os
 import shutil
+import sqlite3
+import sys
 import tempfile
+import threading
 import json
 import ftplib
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class crc16(object):
     """Implementation of the CRC-16 algorithm that complies to the hashlib interface."""
@@ -160,10 +171,134 @@ def make_path(path, mode=0o777):
             raise
 
 
-def copy_path(source, target, resolve_root=False, resolve_links=False):
+# Strategies that can be used to copy file contents, in order of preference.
+COPY_STRATEGIES = ("reflink", "kernel", "buffered")
+
+# Linux ioctl request code to clone (reflink) a file, see ioctl_ficlone(2).
+_FICLONE = 0x40049409
+
+# Error codes that indicate that a copy strategy is not supported for a specific source and target.
+_COPY_NOT_SUPPORTED_ERRNOS = set([errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP,
+                                  errno.EBADF])
+
+
+class _CopyNotSupported(Exception):
+    pass
+
+
+def _copy_file_reflink(source_stream, target_stream):
+    # Share the data blocks of the source file with the target file (copy-on-write), which is supported by e.g. btrfs
+    # and XFS.
+    if fcntl is None:
+        raise _CopyNotSupported()
+
+    try:
+        fcntl.ioctl(target_stream.fileno(), _FICLONE, source_stream.fileno())
+    except EnvironmentError as _error:
+        if _error.errno in _COPY_NOT_SUPPORTED_ERRNOS:
+            raise _CopyNotSupported()
+        raise
+
+
+def _copy_file_kernel(source_stream, target_stream):
+    # Copy the data in-kernel, without transferring it to and from user space.
+    copy_file_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None)
+    if copy_file_range is None and (sendfile is None or not sys.platform.startswith("linux")):
+        raise _CopyNotSupported()
+
+    source_fd, target_fd = source_stream.fileno(), target_stream.fileno()
+    size = os.fstat(source_fd).st_size
+    offset = 0
+    try:
+        while offset < size:
+            count = min(size - offset, 1 << 30)
+            if copy_file_range is not None:
+                copied = copy_file_range(source_fd, target_fd, count)
+            else:
+                copied = sendfile(target_fd, source_fd, offset, count)
+            if copied == 0:
+                break
+            offset += copied
+    except EnvironmentError as _error:
+        if offset == 0 and _error.errno in _COPY_NOT_SUPPORTED_ERRNOS:
+            raise _CopyNotSupported()
+        raise
+
+    # Copy any remaining data in case the source file grew while copying.
+    source_stream.seek(offset)
+    target_stream.seek(offset)
+    shutil.copyfileobj(source_stream, target_stream)
+
+
+def _copy_file_buffered(source_stream, target_stream):
+    shutil.copyfileobj(source_stream, target_stream, 1024 * 1024)
+
+
+_COPY_FUNCTIONS = {
+    "reflink": _copy_file_reflink,
+    "kernel": _copy_file_kernel,
+    "buffered": _copy_file_buffered,
+}
+
+
+def _copy_file_hashed(source_stream, target_stream, hash_func):
+    hash = hash_func()
+    while True:
+        data = source_stream.read(1024 * 1024)
+        if not data:
+            return hash.hexdigest()
+
+        hash.update(data)
+        target_stream.write(data)
+
+
+def copy_file(source, target, strategy="reflink", digests=None, hash_func=hashlib.sha1):
+    """Copy the contents and the permission bits, last access time, last modification time, and flags of the source
+    file to the target file. Returns the name of the copy strategy used.
+
+    The strategy argument determines the first copy strategy that is tried. If a strategy is not supported (by the
+    platform, or by the file system(s) on which the source and target reside), the next strategy is tried, in the
+    order given by COPY_STRATEGIES: "reflink" (clone the file, sharing data blocks on copy-on-write file systems),
+    "kernel" (copy in-kernel using copy_file_range() or sendfile()), and "buffered" (copy via user space buffers).
+
+    If digests is not None, the contents of the file are hashed (using hash_func), and the digest is stored in digests
+    using target as the key. If the file is cloned, the file is read once to compute the digest. Otherwise, the file is
+    hashed while copying via user space buffers (instead of copying in-kernel), such that it is read only once.
+
+    """
+    try:
+        strategies = COPY_STRATEGIES[COPY_STRATEGIES.index(strategy):]
+    except ValueError:
+        raise ValueError("invalid copy strategy: %r" % strategy)
+
+    with open(source, "rb") as source_stream:
+        for strategy in strategies:
+            digest = None
+            with open(target, "wb") as target_stream:
+                try:
+                    if digests is not None and strategy != "reflink":
+                        digest = _copy_file_hashed(source_stream, target_stream, hash_func)
+                        strategy = "buffered"
+                    else:
+                        _COPY_FUNCTIONS[strategy](source_stream, target_stream)
+                except _CopyNotSupported:
+                    source_stream.seek(0)
+                    continue
+
+            if digests is not None:
+                digests[target] = digest if digest is not None else hash_file(source, block_size=None,
+                                                                              hash_func=hash_func)
+            shutil.copystat(source, target)
+            return strategy
+
+    assert False, "buffered copy should always be supported"
+
+
+def copy_path(source, target, resolve_root=False, resolve_links=False, strategy="reflink", workers=1, digests=None):
     """Recursively copy the source path to the destination path. The destination path should not exist. Directories are
     copied as (newly created) directories with the same names, files are copied by copying their contents
-    (using shutil.copy()).
+    (using copy_file()). Returns the set of copy strategies used.
 
     Keyword arguments:
     resolve_root -- If set to True and if the top-level file/directory for the source tree is a symbolic link then the
@@ -176,7 +311,18 @@ def copy_path(source, target, resolve_root=False, resolve_links=False):
                      If set to False, symbolic links in the source tree are copied as (newly created) symbolic links
                      in the destination tree.
 
+    strategy -- The first copy strategy to try when copying file contents, see copy_file().
+
+    workers -- Number of worker threads used to copy files. If larger than 1, the directory tree (including any
+               symbolic links) is created first, after which the files are copied in parallel.
+
+    digests -- If not None, the (SHA1) digest of each file copied is stored in this dictionary, with the target path
+               as the key, see copy_file(). The dictionary can be passed to product_hash() to compute the hash of the
+               copied product without reading the files again.
+
     """
+    files = []
+
     def _copy_path_rec(source, target, resolve_root, resolve_links):
         assert os.path.exists(source) or os.path.islink(source)
 
@@ -206,8 +352,7 @@ def copy_path(source, target, resolve_root=False, resolve_links=False):
                 _copy_path_rec(source_path, target_path, False, resolve_links)
 
         else:
-            shutil.copyfile(source, target)
-            shutil.copystat(source, target)
+            files.append((source, target))
 
     # If the source ends in a path separator and it is a symlink to a directory, then the symlink will be resolved even
     # if resolve_root is set to False. Disallow a root that refers to a file and has a trailing path separator.
@@ -221,9 +366,23 @@ def copy_path(source, target, resolve_root=False, resolve_links=False):
     if os.path.isdir(target) and not source.endswith(os.path.sep):
         target = os.path.join(target, os.path.basename(source))
 
-    # Perform the recursive copy.
+    # Create the directory tree (and symbolic links), and collect the files to copy.
     _copy_path_rec(source, target, resolve_root, resolve_links)
 
+    # Copy the files.
+    def _copy_file(item):
+        return copy_file(item[0], item[1], strategy, digests)
+
+    if workers > 1 and len(files) > 1:
+        pool = multiprocessing.pool.ThreadPool(min(workers, len(files)))
+        try:
+            return set(pool.map(_copy_file, files, chunksize=1))
+        finally:
+            pool.close()
+            pool.join()
+
+    return set(_copy_file(item) for item in files)
+
 
 def remove_path(path):
     if not os.path.isdir(path) or os.path.islink(path):
@@ -279,15 +438,60 @@ def find_paths(root, **kwargs):
     return map(lambda root, depth, path: path, find(root, **kwargs))
 
 
+def default_workers():
+    """Return the default number of worker threads to use for parallel operations."""
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _encode(string):
+    # Hash functions operate on bytes. Strings (e.g. path names) are converted using the file system encoding, such
+    # that the bytes hashed are the same on Python 2 and Python 3.
+    if isinstance(string, bytes):
+        return string
+    try:
+        return os.fsencode(string)
+    except AttributeError:
+        return string.encode(sys.getfilesystemencoding() or "utf-8")
+
+
 def hash_string(string, hash_func=hashlib.sha1):
     hash = hash_func()
-    hash.update(string)
+    hash.update(_encode(string))
     return hash.hexdigest()
 
 
-def hash_file(path, block_size=65536, hash_func=hashlib.sha1):
+def _block_size(size):
+    # Use larger blocks for larger files to reduce the number of read() calls, but limit memory usage per file.
+    return min(max(size // 64, 65536), 16 * 1024 * 1024)
+
+
+def hash_file(path, block_size=65536, hash_func=hashlib.sha1, use_mmap=False):
+    """Return the hexadecimal digest of the contents of a file.
+
+    Keyword arguments:
+    block_size -- Number of bytes to read at a time. If set to None, the block size is chosen based on the size of the
+                  file.
+    use_mmap   -- If set to True, the file is memory mapped instead of read block by block.
+
+    """
     hash = hash_func()
     with open(path, "rb") as stream:
+        if use_mmap or block_size is None:
+            size = os.fstat(stream.fileno()).st_size
+            if block_size is None:
+                block_size = _block_size(size)
+
+            if use_mmap and size > 0:
+                data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    hash.update(data)
+                finally:
+                    data.close()
+                return hash.hexdigest()
+
         while True:
             # Read a block of character data.
             data = stream.read(block_size)
@@ -298,60 +502,215 @@ def hash_file(path, block_size=65536, hash_func=hashlib.sha1):
             hash.update(data)
 
 
+class HashCache(object):
+    """Persistent cache of file digests, stored in an sqlite database file.
+
+    A cached digest is only used if the inode number, size, modification time, and status change time of the file are
+    unchanged since the digest was computed. Note that this means that changes to file contents that do not affect
+    these attributes (e.g. due to disk corruption) are not detected when the cache is used.
+
+    Keyword arguments:
+    refresh -- If set to True, cached digests are ignored (but the cache is still updated with the digests computed).
+
+    """
+    def __init__(self, path, refresh=False):
+        self._path = path
+        self._refresh = refresh
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @staticmethod
+    def _key(path, st, hash_func):
+        try:
+            mtime_ns, ctime_ns = st.st_mtime_ns, st.st_ctime_ns
+        except AttributeError:
+            mtime_ns, ctime_ns = int(st.st_mtime * 1e9), int(st.st_ctime * 1e9)
+
+        hash_name = getattr(hash_func(), "name", None) or hash_func.__name__
+        return os.path.abspath(path), hash_name, st.st_ino, st.st_size, mtime_ns, ctime_ns
+
+    def _cursor(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, timeout=60, check_same_thread=False)
+            with self._connection:
+                self._connection.execute("CREATE TABLE IF NOT EXISTS hash_cache (path TEXT NOT NULL, "
+                                         "hash_func TEXT NOT NULL, inode INTEGER NOT NULL, size INTEGER NOT NULL, "
+                                         "mtime_ns INTEGER NOT NULL, ctime_ns INTEGER NOT NULL, "
+                                         "digest TEXT NOT NULL, PRIMARY KEY (path, hash_func))")
+        return self._connection.cursor()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def lookup(self, path, st, hash_func=hashlib.sha1):
+        """Return the cached digest of the file at path (with stat result st), or None if not available."""
+        if self._refresh:
+            return None
+
+        path, hash_name, inode, size, mtime_ns, ctime_ns = self._key(path, st, hash_func)
+        with self._lock:
+            cursor = self._cursor()
+            try:
+                cursor.execute("SELECT digest FROM hash_cache WHERE path = ? AND hash_func = ? AND inode = ? AND "
+                               "size = ? AND mtime_ns = ? AND ctime_ns = ?",
+                               (path, hash_name, inode, size, mtime_ns, ctime_ns))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+
+        return None if row is None else str(row[0])
+
+    def store(self, entries, hash_func=hashlib.sha1):
+        """Store the digests of one or more files, specified as a list of (path, stat result, digest) tuples."""
+        if not entries:
+            return
+
+        rows = [self._key(path, st, hash_func) + (digest,) for path, st, digest in entries]
+        with self._lock:
+            cursor = self._cursor()
+            try:
+                with self._connection:
+                    cursor.executemany("INSERT OR REPLACE INTO hash_cache (path, hash_func, inode, size, mtime_ns, "
+                                       "ctime_ns, digest) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            finally:
+                cursor.close()
+
+
 # NB. os.path.islink() can be True even if neither os.path.isdir() nor os.path.isfile() is True.
 # NB. os.path.exists() is False for a dangling symbolic link, even if the symbolic link itself does exist.
 def product_hash(roots, resolve_root=True, resolve_links=False, force_encapsulation=False,
-                 hash_func=hashlib.sha1, block_size=65536):
-    def _product_hash_rec(root, resolve_root, resolve_links, hash_func, block_size):
+                 hash_func=hashlib.sha1, block_size=None, use_mmap=False, workers=None, cache=None, digests=None):
+    """Return the hash of a product, which consists of the files and/or directories specified by roots.
+
+    The hash is computed recursively: the hash of a directory is computed from the name, the type of entry, and the
+    hash of each entry in the directory. The contents of the files that make up the product are hashed in parallel
+    using a pool of worker threads. The result does not depend on the number of workers or on the block size used.
+
+    Keyword arguments:
+    block_size -- Number of bytes to read at a time. By default, the block size is chosen based on the size of each
+                  file.
+    use_mmap   -- If set to True, files are memory mapped instead of read block by block.
+    workers    -- Number of worker threads used to hash file contents. By default, the number of CPUs is used.
+    cache      -- HashCache instance used to look up and store file digests.
+    digests    -- Dictionary that maps file paths to the (already known) digest of their contents, e.g. as computed by
+                  copy_path(). These files will not be read.
+
+    """
+    def _collect_rec(root, resolve_root, resolve_links, files):
+        # Collect the structure of the tree rooted at root. Files are collected separately, such that their contents
+        # can be hashed in parallel.
         if os.path.islink(root) and not (resolve_root or resolve_links):
             # Hash link _contents_.
-            return hash_string(os.readlink(root), hash_func)
+            return ("l", os.readlink(root))
 
         elif os.path.isfile(root):
             # Hash file contents.
-            return hash_file(root, block_size, hash_func)
+            files.append(root)
+            return ("f", root)
 
         elif os.path.isdir(root):
-            # Create a fingerprint of the directory by computing the hash of (for each entry in the directory) the hash
-            # of the entry name, the type of entry (link, file, or directory), and the hash of the contents of the
-            # entry.
-            hash = hash_func()
+            entries = []
             for basename in sorted(os.listdir(root)):
-                hash.update(hash_string(basename, hash_func))
-
                 path = os.path.join(root, basename)
                 if os.path.islink(path) and not (resolve_root or resolve_links):
-                    hash.update("l")
+                    entry_type = "l"
                 elif os.path.isdir(path):
-                    hash.update("d")
+                    entry_type = "d"
                 else:
-                    hash.update("f")
+                    entry_type = "f"
 
-                hash.update(_product_hash_rec(path, False, resolve_links, hash_func, block_size))
+                entries.append((basename, entry_type, _collect_rec(path, False, resolve_links, files)))
 
-            return hash.hexdigest()
+            return ("d", entries)
 
         else:
             raise IOError("path does not refer to a regular file or directory: %s" % root)
 
+    def _product_hash_rec(node, digests):
+        node_type, value = node
+        if node_type == "l":
+            return hash_string(value, hash_func)
+
+        elif node_type == "f":
+            return digests[value]
+
+        else:
+            # Create a fingerprint of the directory by computing the hash of (for each entry in the directory) the hash
+            # of the entry name, the type of entry (link, file, or directory), and the hash of the contents of the
+            # entry.
+            hash = hash_func()
+            for basename, entry_type, entry in value:
+                hash.update(_encode(hash_string(basename, hash_func)))
+                hash.update(_encode(entry_type))
+                hash.update(_encode(_product_hash_rec(entry, digests)))
+
+            return hash.hexdigest()
+
+    def _hash_file(path):
+        return hash_file(path, block_size, hash_func, use_mmap)
+
     if isinstance(roots, basestring):
         roots = [roots]
 
+    # Collect the tree structure of each root.
+    files = []
+    nodes = [(root, _collect_rec(root, resolve_root, resolve_links, files)) for root in roots]
+
+    # Use known digests, and look up the digests of files that have not changed since they were last hashed.
+    digests = dict((path, digests[path]) for path in files if digests is not None and path in digests)
+    files = [path for path in files if path not in digests]
+
+    stats = {}
+    if cache is not None:
+        for path in files:
+            stats[path] = os.stat(path)
+            digest = cache.lookup(path, stats[path], hash_func)
+            if digest is not None:
+                digests[path] = digest
+        files = [path for path in files if path not in digests]
+
+    # Hash the contents of all (remaining) files.
+    if workers is None:
+        workers = default_workers()
+
+    if workers > 1 and len(files) > 1:
+        pool = multiprocessing.pool.ThreadPool(min(workers, len(files)))
+        try:
+            digests.update(zip(files, pool.map(_hash_file, files, chunksize=1)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        digests.update((path, _hash_file(path)) for path in files)
+
+    if cache is not None:
+        cache.store([(path, stats[path], digests[path]) for path in files], hash_func)
+
+    # Combine the hashes.
     if len(roots) == 1 and not force_encapsulation:
-        return _product_hash_rec(roots[0], resolve_root, resolve_links, hash_func, block_size)
+        return _product_hash_rec(nodes[0][1], digests)
 
     hash = hash_func()
-    for root in sorted(roots):
-        hash.update(hash_string(os.path.basename(root)))
+    for root, node in sorted(nodes, key=lambda item: item[0]):
+        hash.update(_encode(hash_string(os.path.basename(root))))
 
         if os.path.islink(root) and not (resolve_root or resolve_links):
-            hash.update("l")
+            hash.update(_encode("l"))
         elif os.path.isdir(root):
-            hash.update("d")
+            hash.update(_encode("d"))
         else:
-            hash.update("f")
+            hash.update(_encode("f"))
 
-        hash.update(_product_hash_rec(root, resolve_root, resolve_links, hash_func, block_size))
+        hash.update(_encode(_product_hash_rec(node, digests)))
 
     return hash.hexdigest()
 
@@ -381,18 +740,77 @@ class DownloadError(Exception):
     pass
 
 
+# HTTP sessions are kept per thread (requests.Session is not thread-safe) and per host, such that connections are
+# reused across downloads.
+_http_sessions = threading.local()
+
+
+def _http_session(url):
+    import requests
+
+    sessions = getattr(_http_sessions, "sessions", None)
+    if sessions is None:
+        sessions = _http_sessions.sessions = {}
+
+    key = (url.scheme, url.netloc)
+    session = sessions.get(key)
+    if session is None:
+        session = sessions[key] = requests.Session()
+    return session
+
+
+def _content_range(content_range):
+    """Return the first byte position and the complete length of the remote file from the value of a Content-Range
+    header (e.g. "bytes 100-199/200" or "bytes */200"). Unknown values are returned as None.
+
+    """
+    try:
+        unit, value = content_range.split(None, 1)
+        byte_range, length = value.split('/', 1)
+        start = None if byte_range == '*' else int(byte_range.split('-', 1)[0])
+        return start, None if length == '*' else int(length)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def _http_validator(headers):
+    """Return the validator of the remote file (a strong ETag, or the last modification date) from the headers of an
+    HTTP response, for use in an If-Range header. Return None if the response does not contain a suitable validator.
+
+    """
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
 class Downloader(object):
-    def __init__(self, remote_url, auth_file=None):
+    def __init__(self, remote_url, auth_file=None, chunk_size=1048576):
         self.remote_url = remote_url
         self.auth_file = auth_file
         self.url = urlparse(self.remote_url)
         self.timeout = 60  # we use a timeout of 60 seconds for requests
+        self.chunk_size = chunk_size
 
-    def save(self, local_file):
+    def save(self, local_file, resume=False, hash_func=None, validator_file=None):
+        """Download the remote file to local_file. If resume is True and local_file exists, it is assumed to contain
+        the first part of the remote file (e.g. from an earlier, failed download), and only the remainder of the
+        remote file will be downloaded (if the server supports it).
+
+        If validator_file is not None, a validator of the remote file (the ETag or modification date) is stored in
+        validator_file when the download is started. A partial download is then only resumed if the remote file still
+        matches the stored validator; otherwise, the whole file is downloaded again.
+
+        If hash_func is not None, the hexadecimal digest of the contents of the downloaded file is computed while
+        downloading, and returned.
+
+        """
+        hash = hash_func() if hash_func is not None else None
         if self.remote_url.lower().startswith('ftp'):
-            self._download_ftp(local_file)
+            self._download_ftp(local_file, resume, hash, validator_file)
         else:
-            self._download_http(local_file)
+            self._download_http(local_file, resume, hash, validator_file)
+        return hash.hexdigest() if hash is not None else None
 
     def _get_credentials(self):
         try:
@@ -405,28 +823,157 @@ class Downloader(object):
         except:
             return '', ''
 
-    def _download_http(self, local_file):
-        import requests
+    def _open(self, local_file, append=False, hash=None):
+        """Open local_file for writing. Return the file object and a function that writes data to the file (and
+        updates the hash, if not None). If append is True, data is appended to the contents of the file, which are
+        hashed first.
+
+        """
+        output = open(local_file, 'a+b' if append else 'wb')
+        if hash is None:
+            return output, output.write
+
+        if append:
+            output.seek(0)
+            while True:
+                data = output.read(self.chunk_size)
+                if not data:
+                    break
+                hash.update(data)
+            output.seek(0, os.SEEK_END)
+
+        def write(data):
+            output.write(data)
+            hash.update(data)
+
+        return output, write
+
+    def _read_validator(self, validator_file):
+        if validator_file is None or not os.path.exists(validator_file):
+            return None
+        with open(validator_file) as stream:
+            return stream.read() or None
+
+    def _write_validator(self, validator_file, validator):
+        if validator_file is None:
+            return
+        if validator is None:
+            if os.path.exists(validator_file):
+                os.remove(validator_file)
+        else:
+            with open(validator_file, 'w') as stream:
+                stream.write(validator)
+
+    def _check_size(self, local_file, size):
+        if size is not None and os.path.getsize(local_file) != size:
+            raise DownloadError('incomplete download (%d of %d bytes)' % (os.path.getsize(local_file), size))
+
+    def _download_http(self, local_file, resume=False, hash=None, validator_file=None):
         try:
             username, password = self._get_credentials()
-            r = requests.get(self.remote_url, timeout=self.timeout, auth=(username, password))
-            r.raise_for_status()
-            with open(local_file, 'wb') as output:
-                output.write(r.content)
+            offset = os.path.getsize(local_file) if resume and os.path.exists(local_file) else 0
+
+            # A partial download can only be resumed safely if it can be validated against the remote file.
+            validator = self._read_validator(validator_file) if offset > 0 else None
+            if validator_file is not None and validator is None:
+                offset = 0
+
+            while True:
+                # Request the data as is (without content encoding), such that byte ranges and sizes refer to the
+                # remote file itself. If the remote file does not match the validator, the server returns the whole
+                # file instead of the requested range.
+                headers = {'Accept-Encoding': 'identity'}
+                if offset > 0:
+                    headers['Range'] = 'bytes=%d-' % offset
+                    if validator is not None:
+                        headers['If-Range'] = validator
+
+                r = _http_session(self.url).get(self.remote_url, timeout=self.timeout, auth=(username, password),
+                                                headers=headers, stream=True)
+                if r.status_code != 416 or offset == 0:
+                    break
+
+                # The local file is at least as large as the remote file. It is either complete, or it should be
+                # downloaded again.
+                r.close()
+                if _content_range(r.headers.get('Content-Range'))[1] == offset:
+                    if hash is not None:
+                        self._open(local_file, True, hash)[0].close()
+                    return
+                os.remove(local_file)
+                offset = 0
+
+            try:
+                r.raise_for_status()
+                if r.status_code == 206:
+                    # Partial content; the data is appended to the local file.
+                    start, size = _content_range(r.headers.get('Content-Range'))
+                    if start != offset:
+                        raise DownloadError('unexpected content range: %s' % r.headers.get('Content-Range'))
+                    append = True
+                else:
+                    # The server does not support ranges (or no range was requested); the whole file is downloaded.
+                    content_length = r.headers.get('Content-Length')
+                    size = int(content_length) if content_length is not None else None
+                    append = False
+
+                self._write_validator(validator_file, _http_validator(r.headers))
+                output, write = self._open(local_file, append, hash)
+                with output:
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        write(chunk)
+            finally:
+                r.close()
+
+            self._check_size(local_file, size)
         except Exception as e:
             raise DownloadError('Error downloading %s (Reason: %s)' % (self.remote_url, e))
 
-    def _download_ftp(self, local_file):
+    def _download_ftp(self, local_file, resume=False, hash=None, validator_file=None):
         try:
             username, password = self._get_credentials()
             if username == '':
                 username = 'anonymous'
                 password = 'guest'
             ftp = ftplib.FTP(self.url.hostname, username, password, timeout=self.timeout)
-            ftp.cwd(os.path.dirname(self.url.path))
-            ftp.set_pasv(True)
-            ftp.retrbinary('RETR %s' % os.path.basename(self.url.path), open(local_file, 'wb').write)
-            ftp.quit()
+            try:
+                ftp.cwd(os.path.dirname(self.url.path))
+                ftp.set_pasv(True)
+
+                # Determine the size of the remote file (SIZE is not supported by all servers, and many servers
+                # require binary mode for it).
+                filename = os.path.basename(self.url.path)
+                try:
+                    ftp.voidcmd('TYPE I')
+                    size = ftp.size(filename)
+                except ftplib.all_errors:
+                    size = None
+
+                # Use the size and modification time of the remote file (MDTM is not supported by all servers) to
+                # validate a partial download.
+                try:
+                    validator = "%s %s" % (size, ftp.sendcmd('MDTM %s' % filename))
+                except ftplib.all_errors:
+                    validator = None
+
+                offset = os.path.getsize(local_file) if resume and os.path.exists(local_file) else 0
+                if size is not None and offset > size:
+                    offset = 0
+                if validator_file is not None and offset > 0:
+                    if validator is None or validator != self._read_validator(validator_file):
+                        offset = 0
+                self._write_validator(validator_file, validator)
+
+                output, write = self._open(local_file, offset > 0, hash)
+                with output:
+                    if size is None or offset < size:
+                        ftp.retrbinary('RETR %s' % filename, write, blocksize=self.chunk_size,
+                                       rest=offset if offset > 0 else None)
+                ftp.quit()
+            finally:
+                ftp.close()
+
+            self._check_size(local_file, size)
         except Exception as e:
             raise DownloadError('Error downloading %s (Reason: %s)' % (self.remote_url, e))
 
@@ -26,6 +26,7 @@ setup(
     entry_points={"console_scripts": [
         "muninn-destroy = muninn.tools.destroy:main",
         "muninn-export = muninn.tools.export:main",
+        "muninn-gc = muninn.tools.gc:main",
         "muninn-info = muninn.tools.info:main",
         "muninn-ingest = muninn.tools.ingest:main",
         "muninn-list-tags = muninn.tools.list_tags:main",
@@ -39,6 +40,7 @@ setup(
         "muninn-tag = muninn.tools.tag:main",
         "muninn-untag = muninn.tools.untag:main",
         "muninn-update = muninn.tools.update:main",
+        "muninn-verify-hash = muninn.tools.verify_hash:main",
     ]},
     python_requires=python_req,
     install_requires=requirements
@@ -0,0 +1,213 @@
+#
+# Copyright (C) 2014-2019 S[&]T, The Netherlands.
+#
+# Tests for muninn.util.Downloader, using a local HTTP server that supports Range and If-Range requests. This requires
+# the requests module. The size of the downloaded file (in bytes) can be set using the MUNINN_TEST_DOWNLOAD_SIZE
+# environment variable.
+#
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+import muninn.util as util
+
+
+_DOWNLOAD_SIZE = int(os.environ.get("MUNINN_TEST_DOWNLOAD_SIZE", 256 * 1024 * 1024))
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _max_rss():
+    # Peak resident set size of this process in bytes (ru_maxrss is in kilobytes on Linux, and in bytes on macOS).
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _write_file(path, size, seed):
+    # Write the file in chunks, such that creating a large file does not affect the memory usage of the test.
+    with open(path, "wb") as stream:
+        block = hashlib.sha512(seed).digest() * (_CHUNK_SIZE // 64)
+        written = 0
+        while written < size:
+            count = min(size - written, len(block))
+            stream.write(block[:count])
+            written += count
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serve the files in the root directory of the server, with support for Range and If-Range requests. The ETag of
+    a file is derived from its size and modification time."""
+
+    def do_GET(self):
+        path = os.path.join(self.server.root, self.path.lstrip("/"))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = '"%x-%x"' % (size, int(stat.st_mtime * 1000000))
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        self.server.requests.append((range_header, if_range))
+        if range_header is not None and (if_range is None or if_range == etag):
+            start = int(re.match(r"bytes=(\d+)-$", range_header).group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % size)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                self.server.statuses.append(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, size - 1, size))
+            self.server.statuses.append(206)
+        else:
+            self.send_response(200)
+            self.server.statuses.append(200)
+
+        self.send_header("Content-Length", str(size - start))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        with open(path, "rb") as stream:
+            stream.seek(start)
+            shutil.copyfileobj(stream, self.wfile, 65536)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@unittest.skipIf(requests is None, "requires the requests module")
+class DownloaderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        cls.remote_file = os.path.join(cls.root, "product.dat")
+        _write_file(cls.remote_file, _DOWNLOAD_SIZE, b"version 1")
+        cls.remote_hash = util.hash_file(cls.remote_file)
+
+        cls.server = HTTPServer(("127.0.0.1", 0), _RangeRequestHandler)
+        cls.server.root = cls.root
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:%d/product.dat" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.root)
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.statuses = []
+        self.target = tempfile.mkdtemp()
+        self.local_file = os.path.join(self.target, "product.dat")
+        self.validator_file = os.path.join(self.target, ".validator")
+
+    def tearDown(self):
+        shutil.rmtree(self.target)
+
+    def download(self, resume=True):
+        downloader = util.Downloader(self.url, chunk_size=_CHUNK_SIZE)
+        return downloader.save(self.local_file, resume=resume, hash_func=hashlib.sha1,
+                               validator_file=self.validator_file)
+
+    def interrupted_download(self, size):
+        # Simulate an earlier download that was interrupted after size bytes.
+        self.download()
+        with open(self.local_file, "r+b") as stream:
+            stream.truncate(size)
+        self.server.requests = []
+        self.server.statuses = []
+
+    def test_download(self):
+        max_rss = _max_rss()
+        digest = self.download()
+
+        self.assertEqual(self.server.statuses, [200])
+        self.assertEqual(digest, self.remote_hash)
+        self.assertEqual(util.hash_file(self.local_file), self.remote_hash)
+
+        # The file is streamed to disk, so memory usage should not depend on the size of the file.
+        self.assertLess(_max_rss() - max_rss, 64 * 1024 * 1024)
+
+    def test_resume(self):
+        self.interrupted_download(_DOWNLOAD_SIZE // 3)
+
+        max_rss = _max_rss()
+        digest = self.download()
+
+        # Only the remainder of the file is downloaded; the partial file is hashed before data is appended.
+        self.assertEqual(self.server.statuses, [206])
+        self.assertEqual(self.server.requests[0][0], "bytes=%d-" % (_DOWNLOAD_SIZE // 3))
+        self.assertIsNotNone(self.server.requests[0][1])
+        self.assertEqual(digest, self.remote_hash)
+        self.assertEqual(util.hash_file(self.local_file), self.remote_hash)
+        self.assertLess(_max_rss() - max_rss, 64 * 1024 * 1024)
+
+    def test_already_complete(self):
+        self.interrupted_download(_DOWNLOAD_SIZE)
+
+        digest = self.download()
+
+        self.assertEqual(self.server.statuses, [416])
+        self.assertEqual(digest, self.remote_hash)
+        self.assertEqual(util.hash_file(self.local_file), self.remote_hash)
+
+    def test_remote_file_changed(self):
+        self.interrupted_download(_DOWNLOAD_SIZE // 2)
+
+        # Replace the remote file by a file of the same size with different contents.
+        _write_file(self.remote_file, _DOWNLOAD_SIZE, b"version 2")
+        stat = os.stat(self.remote_file)
+        os.utime(self.remote_file, (stat.st_atime, stat.st_mtime + 10))
+        try:
+            digest = self.download()
+
+            # The validator does not match, so the server returns the whole file, which replaces the partial file.
+            self.assertEqual(self.server.statuses, [200])
+            self.assertIsNotNone(self.server.requests[0][0])
+            remote_hash = util.hash_file(self.remote_file)
+            self.assertNotEqual(remote_hash, self.remote_hash)
+            self.assertEqual(digest, remote_hash)
+            self.assertEqual(util.hash_file(self.local_file), remote_hash)
+        finally:
+            _write_file(self.remote_file, _DOWNLOAD_SIZE, b"version 1")
+
+    def test_partial_file_without_validator(self):
+        self.interrupted_download(_DOWNLOAD_SIZE // 2)
+        os.remove(self.validator_file)
+
+        digest = self.download()
+
+        # A partial file that cannot be validated is downloaded again.
+        self.assertEqual(self.server.requests, [(None, None)])
+        self.assertEqual(self.server.statuses, [200])
+        self.assertEqual(digest, self.remote_hash)
+        self.assertEqual(util.hash_file(self.local_file), self.remote_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+#
+# Copyright (C) 2014-2019 S[&]T, The Netherlands.
+#
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import unittest
+import uuid
+
+from muninn.archive import _decode_page_token, _encode_page_token
+from muninn.exceptions import Error
+
+
+class PageTokenTest(unittest.TestCase):
+    order_by = ["+core.validity_start", "-core.size", "+core.uuid"]
+
+    def round_trip(self, values):
+        token = _encode_page_token(self.order_by, values)
+        self.assertEqual(_decode_page_token(token, self.order_by), values)
+
+    def test_timestamps(self):
+        product_uuid = uuid.uuid4()
+        self.round_trip([datetime.datetime(2019, 4, 3, 12, 30, 15, 123456), 10, product_uuid])
+        self.round_trip([datetime.datetime.min, 10, product_uuid])
+        self.round_trip([datetime.datetime(999, 12, 31, 23, 59, 59, 999999), 10, product_uuid])
+        self.round_trip([datetime.datetime(1850, 1, 1), 10, product_uuid])
+        self.round_trip([datetime.datetime.max, 10, product_uuid])
+
+    def test_undefined_values(self):
+        self.round_trip([None, None, uuid.uuid4()])
+
+    def test_sort_order_mismatch(self):
+        token = _encode_page_token(self.order_by, [None, 1, uuid.uuid4()])
+        self.assertRaises(Error, _decode_page_token, token, ["+core.uuid"])
+
+    def test_invalid_token(self):
+        self.assertRaises(Error, _decode_page_token, "invalid", self.order_by)
+
+
+if __name__ == "__main__":
+    unittest.main()